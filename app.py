@@ -1,218 +1,126 @@
-import json
-import re
+import atexit
 import traceback
-from collections import defaultdict
 from datetime import datetime, timedelta, time
-from enum import Enum
+from zoneinfo import ZoneInfo
 
+import numpy as np
 import pandas as pd
-import pytz
-import requests
 import streamlit as st
 from streamlit.logger import get_logger
 
-logger = get_logger(__name__)
-
-PST_TIME_ZONE = 'America/Los_Angeles'
-BELLEVUE_BADMINTON_CLUB_ORG_ID = 7031
-CLUB_OPENING_HOURS = (6, 22)  # open, close hour
-COURT_BOOKINGS_API_URL = 'https://memberschedulers.courtreserve.com/SchedulerApi/ReadExpandedApi'
-COURT_RESERVATIONS_LANDING_PAGE_URL = 'https://app.courtreserve.com/Online/Reservations/Bookings'
-
+from courtfinder.availability import CourtAvailability
+from courtfinder.constants import (BBCLocation, CLUB_OPENING_HOURS, COURT_TIMES_HISTORY_DIR, COURT_TIMES_REQUEST_TIMEOUT_SECONDS,
+                                   METRICS_PORT, PST_TIME_ZONE)
+from courtfinder.fetch import (fetch_court_times_data_cached, get_circuit_breaker, get_court_times_cache, get_court_times_session,
+                               get_rate_limiter, get_stale_court_times_age_seconds)
+from courtfinder.history import CourtTimesHistory
+from courtfinder.links import get_court_link
+from courtfinder.metrics import get_metrics_registry, span, start_metrics_server, timed
+from courtfinder.prefetch import PrefetchScheduler
+from courtfinder.snapshots import AvailabilitySnapshotStore
+from courtfinder.timeutils import (get_default_datetime, get_formatted_time, get_formatted_time_by_hour,
+                                   get_last_court_start_time, get_slot_index, get_time_by_hour)
+from courtfinder.watch import WaitlistWatcher, create_notifier
 
-class BBCLocation(Enum):
-    BELLEVUE = "Bellevue"
-    MUKILTEO = "Mukilteo"
-    RENTON = "Renton"
-    MUKILTEO_PICKLEBALL = "Mukilteo Pickleball"
-
-    @classmethod
-    def get_all_locations(cls):
-        return [location.value for location in BBCLocation]
+logger = get_logger(__name__)
+# Routes the core's logs through Streamlit's handler as well
+get_logger('courtfinder')
 
-    @classmethod
-    def get_default_locations(cls):
-        return [location.value for location in BBCLocation if location != BBCLocation.MUKILTEO_PICKLEBALL]
 
+############################################################################################
+# Shared resources
+############################################################################################
+@st.cache_resource
+def get_availability_snapshot_store() -> AvailabilitySnapshotStore:
+    store = AvailabilitySnapshotStore()
+    get_court_times_cache().add_listener(store.on_court_times_loaded)
+    return store
 
-EARLY_ACCESS_PREFIX = "Early Access: "
 
-LOCATION_NAME_TO_ID_MAPPING = {
-    BBCLocation.BELLEVUE.value: 1476,
-    BBCLocation.MUKILTEO.value: 1478,
-    BBCLocation.RENTON.value: 1479,
-    EARLY_ACCESS_PREFIX + BBCLocation.BELLEVUE.value: 1503,
-    EARLY_ACCESS_PREFIX + BBCLocation.MUKILTEO.value: 1504,
-    EARLY_ACCESS_PREFIX + BBCLocation.RENTON.value: 1505,
-    BBCLocation.MUKILTEO_PICKLEBALL.value: 15460
-}
+@st.cache_resource
+def get_court_times_history():
+    if not COURT_TIMES_HISTORY_DIR:
+        return None
+    history = CourtTimesHistory(COURT_TIMES_HISTORY_DIR)
+    get_court_times_cache().add_listener(history.on_court_times_loaded)
+    return history
 
 
-############################################################################################
-# Fetch data
-############################################################################################
-def fetch_court_times_data(court_date: datetime):
-    headers = {
-        'accept': '*/*',
-        'accept-language': 'en-US,en;q=0.9',
-        'origin': 'https://app.courtreserve.com',
-        'priority': 'u=1, i',
-        'referer': 'https://app.courtreserve.com/',
-        'sec-ch-ua': '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
-        'sec-ch-ua-mobile': '?0',
-        'sec-ch-ua-platform': '"macOS"',
-        'sec-fetch-dest': 'empty',
-        'sec-fetch-mode': 'cors',
-        'sec-fetch-site': 'same-site',
-        'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
-    }
-    utc_datetime = court_date.astimezone(pytz.utc)
-    params = {
-        'id': str(BELLEVUE_BADMINTON_CLUB_ORG_ID),
-        'uiCulture': 'en-US',
-        'sort': '',
-        'group': '',
-        'filter': '',
-        'jsonData': json.dumps({
-            'startDate': utc_datetime.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
-            'orgId': str(BELLEVUE_BADMINTON_CLUB_ORG_ID),
-            'TimeZone': PST_TIME_ZONE,
-            'Date': court_date.strftime('%a, %d %b %Y %H:%M:%S GMT'),
-            'KendoDate': {'Year': court_date.year, 'Month': court_date.month, 'Day': court_date.day},
-            'UiCulture': 'en-US',
-            'CostTypeId': '88166',
-            'CustomSchedulerId': '',  # Retrieves for all locations
-            'ReservationMinInterval': '60',
-            'SelectedCourtIds': '',  # Retrieves for all court numbers
-            'SelectedInstructorIds': '',
-            'MemberIds': '',
-            'MemberFamilyId': '',
-            'EmbedCodeId': '',
-            'HideEmbedCodeReservationDetails': 'True'
-        })
-    }
-    try:
-        response = requests.get(COURT_BOOKINGS_API_URL, params=params, headers=headers)
-        response.raise_for_status()  # Raise an exception for non-2xx status codes
-        return response.json()['Data']
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching court times data: {e}")
-        raise e
-
-
-def get_available_court_times_by_location(court_date: datetime) -> dict:
-    logger.info(f"Fetching reserved court times on {court_date}.")
-    court_times = fetch_court_times_data(court_date)
-    reserved_court_times_by_location = defaultdict(lambda: defaultdict(list))
-    available_court_times_by_location = defaultdict(lambda: defaultdict(list))
-
-    for item in court_times:
-        # Noticed there are these entries usually for Bellevue 10 and 11 that block 10 hours but don't actually
-        # show up on CourtReserve. These are the fields that seem to differentiate them from other entries (when all
-        # three fields are 'False').
-        # Revisit this if we notice that this is causing reserved slots to get dropped.
-        if not item["EventOnlineSignUpOff"] and not item["CanSignUpToEvent"] and not item["RegistrationOpen"]:
-            continue
-
-        court_location, court_number = get_court_location_and_name(item)
-        reserved_court_times_by_location[court_location][court_number].append(
-            (get_reserved_court_start_end_times(item)))
-        available_court_times_by_location[court_location][court_number] = []
-
-    available_30min_intervals = generate_30min_intervals_end_time_inclusive(
-        get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[0], PST_TIME_ZONE),
-        get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[1], PST_TIME_ZONE))
-
-    for location, court_times_by_court_number in reserved_court_times_by_location.items():
-        for court_number, reserved_court_times in court_times_by_court_number.items():
-            available_court_times = []
-            for i in range(len(available_30min_intervals) - 1):
-                interval_start = available_30min_intervals[i]
-                interval_end = available_30min_intervals[i + 1]
-                is_available = True
-                for reserved_start, reserved_end in reserved_court_times:
-                    # Check if the interval is reserved
-                    if interval_end <= reserved_start or interval_start >= reserved_end:
-                        continue
-                    else:
-                        is_available = False
-                        break
-                if is_available:
-                    available_court_times.append((interval_start, interval_end))
-            available_court_times_by_location[location][court_number] = available_court_times
-    return available_court_times_by_location
-
-
-def get_court_location_and_name(item: dict):
-    court_label = item["CourtLabel"]
-    space_delimited_court_label = court_label.split(' ')
-    if len(space_delimited_court_label) == 3 and "COACHING" not in court_label.upper():  # e.g. "Mukilteo Pickleball 12"
-        court_location = f"{space_delimited_court_label[0]} {space_delimited_court_label[1]}"
-        court_number = space_delimited_court_label[2]
-    else:
-        court_location = space_delimited_court_label[0]
-        court_number = space_delimited_court_label[1]
-    return court_location, f"Court {court_number}"
+@st.cache_resource
+def get_prefetch_scheduler() -> PrefetchScheduler:
+    scheduler = PrefetchScheduler(get_court_times_cache(), get_court_times_session())
+    scheduler.start()
+    atexit.register(scheduler.stop, timeout=COURT_TIMES_REQUEST_TIMEOUT_SECONDS)
+    return scheduler
 
 
-def get_reserved_court_start_end_times(item: dict):
-    start_utc = item["Start"][:-1]
-    end_utc = item["End"][:-1]
+@st.cache_resource
+def get_waitlist_watcher():
+    notifier = create_notifier()
+    if notifier is None:
+        return None
+    watcher = WaitlistWatcher(get_court_times_cache(), get_court_times_session(), notifier, get_availability_snapshot_store())
+    get_court_times_cache().add_listener(watcher.on_court_times_loaded)
+    watcher.start()
+    atexit.register(watcher.stop, timeout=COURT_TIMES_REQUEST_TIMEOUT_SECONDS)
+    return watcher
 
-    start_dt_utc = pytz.utc.localize(datetime.fromisoformat(start_utc))
-    end_dt_utc = pytz.utc.localize(datetime.fromisoformat(end_utc))
 
-    pst = pytz.timezone(PST_TIME_ZONE)
-
-    return start_dt_utc.astimezone(pst), end_dt_utc.astimezone(pst)
+@st.cache_resource
+def get_metrics_server():
+    if not METRICS_PORT:
+        return None
+    return start_metrics_server(int(METRICS_PORT))
 
 
 ############################################################################################
 # UI Data Refreshes
 ############################################################################################
+@timed()
 def update_compact_view_available_court_times():
-    if not st.session_state.df_by_location:
+    availability = st.session_state.court_availability
+    if availability is None or not availability.courts_by_location:
         return
 
     start_time = st.session_state.time_range_filter[0]
     end_time = st.session_state.time_range_filter[1]
 
-    logger.info(f"Creating a compact view for {st.session_state.locations_filter}, from {start_time} to {end_time}.")
-    intervals = pd.date_range(start=start_time, end=get_last_court_start_time(end_time), freq='30min')
-    columns = sorted(
-        st.session_state.locations_filter + [reserve_button_column_name(location) for location in st.session_state.locations_filter])
+    # Only rebuild when the data or one of the filters it depends on actually changed since the last rerun
+    compact_view_key = (st.session_state.court_occupancy_version, tuple(st.session_state.locations_filter),
+                        get_formatted_time(start_time), get_formatted_time(end_time))
+    if compact_view_key == st.session_state.compact_view_key:
+        return
 
-    compact_view_df = pd.DataFrame(index=intervals, columns=columns)
+    logger.info(f"Creating a compact view for {st.session_state.locations_filter}, from {start_time} to {end_time}.")
+    slots = range(get_slot_index(start_time), get_slot_index(get_last_court_start_time(end_time)) + 1)
+    slot_starts = [availability.get_slot_start(slot) for slot in slots]
+    columns = {}
     for location in st.session_state.locations_filter:
-        single_location_df = st.session_state.df_by_location[location]
-        for index in compact_view_df.index:
-            available_courts = []
-            for court_number in single_location_df.columns:
-                if not pd.isnull(single_location_df.loc[index.strftime('%I:%M %p'), court_number]):
-                    available_courts.append(court_number)
-            if available_courts:
-                link = get_court_link(location, index)
-                compact_view_df.at[index, reserve_button_column_name(location)] = link
-            compact_view_df.at[index, location] = available_courts
+        courts = availability.courts_by_location.get(location, ())
+        masks = availability.masks_by_location.get(location, ())
+        any_court_free_mask = availability.get_any_court_free_mask(location)
+        columns[location] = [[court for court, mask in zip(courts, masks) if mask >> slot & 1] for slot in slots]
+        columns[reserve_button_column_name(location)] = [get_court_link(location, slot_start) if any_court_free_mask >> slot & 1 else None
+                                                         for slot, slot_start in zip(slots, slot_starts)]
 
-    compact_view_df.index = compact_view_df.index.strftime('%I:%M %p')
-    st.session_state.compact_view_df = compact_view_df
+    compact_view_df = pd.DataFrame(columns, index=[get_formatted_time(slot_start) for slot_start in slot_starts])
+    st.session_state.compact_view_df = compact_view_df[sorted(columns)]
+    st.session_state.compact_view_key = compact_view_key
 
 
+@timed()
 def update_available_courts_for_date():
     court_date = st.session_state.date_input_datetime
-    available_court_times_by_location = get_available_court_times_by_location(court_date)
-    for location, court_times_by_court_number in available_court_times_by_location.items():
-        start_time, end_time = get_default_date_range_filter()
-        intervals = pd.date_range(start=start_time, end=get_last_court_start_time(end_time), freq='30min')
-        df = pd.DataFrame(index=intervals, columns=sorted(court_times_by_court_number.keys(), key=get_court_number))
-        for court, times in court_times_by_court_number.items():
-            for start, end in times:
-                link = get_court_link(location, start)
-                text = f"✓ {start.strftime('%I:%M %p')}"
-                df.loc[(df.index >= start) & (df.index < end), court] = f"{link}&{text}"
-        df.index = df.index.strftime('%I:%M %p')
-        st.session_state.df_by_location[location] = df
+    court_times = fetch_court_times_data_cached(court_date)
+    # The shared cache hands back the same payload until it is refreshed, so there is nothing to rebuild
+    if court_times is st.session_state.court_times and court_date == st.session_state.court_occupancy_date:
+        return
+
+    st.session_state.court_times = court_times
+    # Usually already computed when the cache loaded the payload, sessions showing the same date share it
+    st.session_state.court_availability = get_availability_snapshot_store().get_for_court_times(court_date.date(), court_times)
+    st.session_state.court_occupancy_date = court_date
+    st.session_state.court_occupancy_version += 1
 
 
 ############################################################################################
@@ -222,33 +130,42 @@ def reserve_button_column_name(location: str):
     return location + ' Reserve'
 
 
-def get_court_link(location_name: str, court_start: datetime):
-    try:
-        return get_bbc_court_reservation_page(get_location_id_by_name_and_start_hour(location_name, court_start))
-    except Exception as e:
-        logger.error(f"Unable to get a link for {location_name} - {type(e).__name__}: {str(e)}")
-        logger.error(traceback.format_exc())  # Print the full traceback
+def get_location_dataframe(availability: CourtAvailability, location: str) -> pd.DataFrame:
+    # Built on every render rather than kept in the session, the link and label strings only live for the rerun
+    slot_starts = [availability.get_slot_start(slot) for slot in range(availability.slot_count)]
+    cells = np.array([f"{get_court_link(location, slot_start)}&✓ {get_formatted_time(slot_start)}"
+                      for slot_start in slot_starts], dtype=object)
+    return pd.DataFrame(np.where(availability.get_free_matrix(location).T, cells[:, None], None),
+                        index=[get_formatted_time(slot_start) for slot_start in slot_starts],
+                        columns=list(availability.courts_by_location[location]))
 
 
-def get_location_id_by_name_and_start_hour(location_name: str, court_start: datetime):
-    try:
-        # Check if it's Early Access
-        if ((court_start.weekday() < 5 and court_start.time() < time(9, 0) or  # Weekdays before 9AM
-             court_start.weekday() >= 6 and court_start.time() < time(8, 0)) and  # Weekends before 8AM
-                "Pickleball" not in location_name):
-            location_lookup_name = EARLY_ACCESS_PREFIX + location_name
-        else:
-            location_lookup_name = location_name
-        location_id = LOCATION_NAME_TO_ID_MAPPING[location_lookup_name]
-        return location_id
-    except KeyError as e:
-        logger.error(
-            f"Unable to get location id for {location_name}. We only have mappings for {LOCATION_NAME_TO_ID_MAPPING.keys()}.")
-        raise e
+def display_watch_form(waitlist_watcher: WaitlistWatcher):
+    start_time, end_time = st.session_state.time_range_filter
+    with st.expander(f"Get notified when a court opens up from {get_formatted_time(start_time)} to {get_formatted_time(end_time)}"):
+        with st.form("watch_form", border=False):
+            contact = st.text_input("Your name or handle", help="Sent along with the notification so that it reaches you.")
+            if st.form_submit_button("Notify me") and contact:
+                try:
+                    waitlist_watcher.register(start_time.date(), st.session_state.locations_filter, start_time.time(), end_time.time(),
+                                              int((end_time - start_time).total_seconds()) // 60, contact)
+                    st.success(f"We'll let you know as soon as a court at {', '.join(st.session_state.locations_filter)} is free.")
+                except ValueError as e:
+                    st.warning(str(e))
 
 
-def get_bbc_court_reservation_page(location_id: int):
-    return f"{COURT_RESERVATIONS_LANDING_PAGE_URL}/{BELLEVUE_BADMINTON_CLUB_ORG_ID}?sId={location_id}"
+def display_stale_warning():
+    stale_age_seconds = get_stale_court_times_age_seconds(st.session_state.date_input_datetime)
+    if stale_age_seconds is not None:
+        stale_age_minutes = max(round(stale_age_seconds / 60), 1)
+        st.warning(f"CourtReserve isn't responding right now, these are the court times from {stale_age_minutes} "
+                   f"minute{'s' if stale_age_minutes > 1 else ''} ago. Some courts may have been reserved since.")
+
+
+def display_error(e: Exception):
+    logger.error(f"{type(e).__name__}: {str(e)}")
+    logger.error(traceback.format_exc())  # Print the full traceback
+    st.error("Oops, something went wrong.")
 
 
 def get_duration_options(max_hours=4, increments_in_hours=0.5):
@@ -313,60 +230,103 @@ def display_time_range_picker():
 
 
 ############################################################################################
-# Util
+# UI Sections
 ############################################################################################
-def get_default_date_range_filter() -> tuple[datetime, datetime]:
-    start_time = get_datetime_by_hour(st.session_state.date_input_datetime, CLUB_OPENING_HOURS[0], PST_TIME_ZONE)
-    end_time = get_datetime_by_hour(st.session_state.date_input_datetime, CLUB_OPENING_HOURS[1], PST_TIME_ZONE)
-    return start_time, end_time
+# Fragments rerun on their own when one of their widgets changes, so e.g. picking another time range only recomputes
+# and re-sends the compact view, not the full-day tables. A full rerun, e.g. on a date change, reruns both.
+# Errors are caught in each of them, as a fragment rerun doesn't go through main().
+@st.experimental_fragment
+def display_filtered_view(waitlist_watcher: WaitlistWatcher):
+    try:
+        # Also on fragment reruns, which don't go through main(), to pick up court times refreshed since the last one
+        update_available_courts_for_date()
+        display_stale_warning()
 
+        display_time_range_picker()
 
-def get_datetime_by_hour(date: datetime, hour: int, timezone: str):
-    return pytz.timezone(timezone).localize(datetime.combine(date, time(hour=hour)))
+        st.session_state.locations_filter = st.multiselect("Locations",
+                                                           placeholder="Choose a location",
+                                                           options=BBCLocation.get_all_locations(),
+                                                           default=BBCLocation.get_default_locations())
+        st.divider()
 
+        update_compact_view_available_court_times()
 
-def get_last_court_start_time(end_time: datetime):
-    return end_time - timedelta(minutes=30)
+        st.info("'✓ / Reserve' only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
 
+        if st.session_state.compact_view_df is not None:
+            st.write(f"### Available courts from {get_formatted_time(st.session_state.time_range_filter[0])} to "
+                     f"{get_formatted_time(st.session_state.time_range_filter[1])} for {', '.join(st.session_state.locations_filter)}")
+            with st.expander("How do I read/use this?"):
+                st.write("- This is a filtered/compact view of the tables in the next section showing court-availability across locations.")
+                st.write("- Each column is a BBC location.")
+                st.write("- Each row lists the courts that should be open for reservation on CourtReserve at that starting time.")
+                st.write("- 'Reserve' only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
 
-def generate_30min_intervals_end_time_inclusive(start_time: datetime, end_time: datetime):
-    intervals = []
-    current_time = start_time
-    while current_time <= end_time:
-        intervals.append(current_time)
-        current_time += timedelta(minutes=30)
-    return intervals
+            if waitlist_watcher and st.session_state.locations_filter:
+                display_watch_form(waitlist_watcher)
+
+            with span('render_compact_view'):
+                st.dataframe(st.session_state.compact_view_df,
+                             column_config={reserve_button_column_name(location):
+                                                st.column_config.LinkColumn(label=f"{location}",
+                                                                            display_text="Reserve",
+                                                                            help=f"This just links to the {location} Reservations page on CourtReserve. "
+                                                                                 f"You have to set the date in the calendar yourself and find the relevant slot to reserve.")
+                                            for location in st.session_state.locations_filter})
+            st.divider()
+    except Exception as e:
+        display_error(e)
 
 
-def get_default_datetime():
-    current_datetime = datetime.now(pytz.timezone(PST_TIME_ZONE))
-    if current_datetime.time() > time(21, 30):  # Latest court time is 9:30 PM
-        return current_datetime + timedelta(days=1)
-    return current_datetime
+@st.experimental_fragment
+def display_full_day_view():
+    try:
+        availability = st.session_state.court_availability
+        # Another date's court times are left when loading the picked date failed
+        if (availability is None or not availability.courts_by_location
+                or st.session_state.court_occupancy_date != st.session_state.date_input_datetime):
+            return
+
+        st.write(f"### Available courts from Opening ({get_formatted_time_by_hour(CLUB_OPENING_HOURS[0])}) to "
+                 f"Close ({get_formatted_time_by_hour(CLUB_OPENING_HOURS[1])})")
+        with st.expander("How do I read/use this?"):
+            st.write("- These are the non-filtered court-availability views that should resemble the CourtReserve page when you click into specific locations under 'Reservations'.")
+            st.write("- ✓ 07:00 AM - means a court should be open for reservation on CourtReserve with starting time at 07:00 AM. It only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
+            st.write("- None - means the court is not available to be reserved at that time slot.")
+        # Only the picked location's table is built and sent, the others would mostly go unlooked at
+        location = st.radio("Location", list(availability.courts_by_location), index=None, horizontal=True, key="full_day_location",
+                            help="Shows every court of the location for the whole day.")
+        if location is None:
+            return
+
+        df = get_location_dataframe(availability, location)
+        st.write(f"#### :green[{location}]")
+
+        # HACK!! to display a clickable <a href='{link}' target='_blank'>{text}</a>
+        # The right way to have clickable links in dataframe is through: df.style.format(make_clickable).
+        # Unfortunately st.dataframe() does not support this and does not render <a> tags properly: https://github.com/streamlit/streamlit/issues/4830
+        # and displaying it in html is not as nice: st.markdown(df_styled.to_html(escape=False, render_links=True), unsafe_allow_html=True)
+        #
+        # Each cell in the dataframe contains f"{link}&{text}".
+        # LinkColumn requires the cell values to be clickable link strings and limits the display_text to be a regex for extracting texts
+        # in order to have cell-dependent texts.
+        # So here we're extracting everything after '&', which should be the label.
+        with span('render_location_table'):
+            st.dataframe(df, column_config={column: st.column_config.LinkColumn(column,
+                                                                                display_text="&(.*)",
+                                                                                help=f"This just links to the {column} Reservations page on CourtReserve. "
+                                                                                     f"You have to set the date in the calendar yourself and find the relevant slot to reserve.")
+                                            for column in df.columns})
+    except Exception as e:
+        display_error(e)
 
 
+############################################################################################
+# Util
+############################################################################################
 def to_pst_datetime(utc_time: time):
-    return pytz.timezone(PST_TIME_ZONE).localize(datetime.combine(st.session_state.date_input_datetime, utc_time))
-
-
-def get_formatted_time(time_to_format):
-    return time_to_format.strftime('%I:%M %p')
-
-
-def get_formatted_time_by_hour(hour: int):
-    return get_formatted_time(get_time_by_hour(hour))
-
-
-def get_time_by_hour(hour: int):
-    return time(hour, 0)
-
-
-def get_court_number(court_name: str):
-    match = re.search(r'\d+', court_name)
-    if match:
-        return int(match.group())
-    else:
-        return float('inf')
+    return datetime.combine(st.session_state.date_input_datetime, utc_time, tzinfo=ZoneInfo(PST_TIME_ZONE))
 
 
 ############################################################################################
@@ -394,77 +354,49 @@ def main():
             st.session_state.time_range_filter = ()
         if 'date_input_datetime' not in st.session_state:
             st.session_state.date_input_datetime = None
-        if 'df_by_location' not in st.session_state:
-            st.session_state.df_by_location = {}
         if 'compact_view_df' not in st.session_state:
             st.session_state.compact_view_df = None
+        if 'compact_view_key' not in st.session_state:
+            st.session_state.compact_view_key = None
+        if 'court_times' not in st.session_state:
+            st.session_state.court_times = None
+        if 'court_availability' not in st.session_state:
+            st.session_state.court_availability = None
+        if 'court_occupancy_date' not in st.session_state:
+            st.session_state.court_occupancy_date = None
+        if 'court_occupancy_version' not in st.session_state:
+            st.session_state.court_occupancy_version = 0
+
+        get_availability_snapshot_store()
+        get_court_times_history()
+        prefetch_scheduler = get_prefetch_scheduler()
+        get_metrics_server()
+        waitlist_watcher = get_waitlist_watcher()
 
         current_datetime = get_default_datetime()
         date_input = st.date_input("Date", current_datetime,
                                    max_value=current_datetime + timedelta(days=30))
 
-        st.session_state.date_input_datetime = pytz.timezone(PST_TIME_ZONE).localize(datetime.combine(date_input, datetime.min.time()))
+        st.session_state.date_input_datetime = datetime.combine(date_input, datetime.min.time(), tzinfo=ZoneInfo(PST_TIME_ZONE))
 
-        display_time_range_picker()
+        # Loads the court times of the date for both views
+        display_filtered_view(waitlist_watcher)
+        display_full_day_view()
 
-        update_available_courts_for_date()
-
-        st.session_state.locations_filter = st.multiselect("Locations",
-                                                           placeholder="Choose a location",
-                                                           options=BBCLocation.get_all_locations(),
-                                                           default=BBCLocation.get_default_locations())
-        st.divider()
-
-        update_compact_view_available_court_times()
-
-        st.info("'✓ / Reserve' only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
-
-        if st.session_state.compact_view_df is not None:
-            st.write(f"### Available courts from {get_formatted_time(st.session_state.time_range_filter[0])} to "
-                     f"{get_formatted_time(st.session_state.time_range_filter[1])} for {', '.join(st.session_state.locations_filter)}")
-            with st.expander("How do I read/use this?"):
-                st.write("- This is a filtered/compact view of the tables in the next section showing court-availability across locations.")
-                st.write("- Each column is a BBC location.")
-                st.write("- Each row lists the courts that should be open for reservation on CourtReserve at that starting time.")
-                st.write("- 'Reserve' only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
-
-            st.dataframe(st.session_state.compact_view_df,
-                         column_config={reserve_button_column_name(location):
-                                            st.column_config.LinkColumn(label=f"{location}",
-                                                                        display_text="Reserve",
-                                                                        help=f"This just links to the {location} Reservations page on CourtReserve. "
-                                                                             f"You have to set the date in the calendar yourself and find the relevant slot to reserve.")
-                                        for location in st.session_state.locations_filter})
+        # Hidden debug view, add ?debug=true to the URL
+        if st.query_params.get("debug"):
             st.divider()
-
-        if st.session_state.df_by_location:
-            st.write(f"### Available courts from Opening ({get_formatted_time_by_hour(CLUB_OPENING_HOURS[0])}) to "
-                     f"Close ({get_formatted_time_by_hour(CLUB_OPENING_HOURS[1])})")
-            with st.expander("How do I read/use this?"):
-                st.write("- These are the non-filtered court-availability views that should resemble the CourtReserve page when you click into specific locations under 'Reservations'.")
-                st.write("- ✓ 07:00 AM - means a court should be open for reservation on CourtReserve with starting time at 07:00 AM. It only links to the Reservations page on CourtReserve for each location. You'll need to manually set the date and find the available slot to reserve.")
-                st.write("- None - means the court is not available to be reserved at that time slot.")
-            for location, df in st.session_state.df_by_location.items():
-                st.write(f"#### :green[{location}]")
-
-                # HACK!! to display a clickable <a href='{link}' target='_blank'>{text}</a>
-                # The right way to have clickable links in dataframe is through: df.style.format(make_clickable).
-                # Unfortunately st.dataframe() does not support this and does not render <a> tags properly: https://github.com/streamlit/streamlit/issues/4830
-                # and displaying it in html is not as nice: st.markdown(df_styled.to_html(escape=False, render_links=True), unsafe_allow_html=True)
-                #
-                # Each cell in the dataframe contains f"{link}&{text}".
-                # LinkColumn requires the cell values to be clickable link strings and limits the display_text to be a regex for extracting texts
-                # in order to have cell-dependent texts.
-                # So here we're extracting everything after '&', which should be the label.
-                st.dataframe(df, column_config={column: st.column_config.LinkColumn(column,
-                                                                                    display_text="&(.*)",
-                                                                                    help=f"This just links to the {column} Reservations page on CourtReserve. "
-                                                                                         f"You have to set the date in the calendar yourself and find the relevant slot to reserve.")
-                                                for column in df.columns})
+            st.write("### Debug")
+            st.write("Court times cache")
+            st.json(get_court_times_cache().stats())
+            st.write("Prefetch status")
+            st.json(prefetch_scheduler.status())
+            st.write("CourtReserve circuit breaker and rate limiter")
+            st.json({"circuit_breaker": get_circuit_breaker().status(), "rate_limiter": get_rate_limiter().status()})
+            st.write("Metrics")
+            st.code(get_metrics_registry().render(), language='text')
     except Exception as e:
-        logger.error(f"{type(e).__name__}: {str(e)}")
-        logger.error(traceback.format_exc())  # Print the full traceback
-        st.error("Oops, something went wrong.")
+        display_error(e)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,8 @@
+"""
+Benchmarks and load tests, run against a local fixture server instead of CourtReserve:
+
+    python -m benchmarks.micro --output micro.json
+    python -m benchmarks.load --sessions 50 --reruns 20 --latency 0.2 --output load.json
+    python -m benchmarks.faults --output faults.json
+    python -m benchmarks.fixture_server --port 8765 --latency 0.2 --error-rate 0.05
+"""
@@ -0,0 +1,115 @@
+"""
+Fault injection scenario checking how courtfinder rides out a CourtReserve outage, reported as JSON.
+
+Clients keep reading court times through the shared cache while the fixture server goes from healthy, to failing
+every request, to throttling, and back to healthy. Every phase reports how many reads got fresh court times, stale
+ones served from the cache, or an error, how long they took, and how many requests actually reached upstream.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time as timer
+from datetime import timedelta
+
+import numpy as np
+
+from benchmarks.fixture_server import FixtureServer, use_fixture_server
+
+PHASES = [
+    ("healthy", {"error_rate": 0, "throttle_rate": 0}),
+    ("outage", {"error_rate": 1, "throttle_rate": 0}),
+    ("throttled", {"error_rate": 0, "throttle_rate": 0.5}),
+    ("recovered", {"error_rate": 0, "throttle_rate": 0}),
+]
+
+
+def run_client(client_id: int, args, court_dates: list, stop: threading.Event, outcomes: list):
+    from courtfinder.fetch import fetch_court_times_data_cached, get_stale_court_times_age_seconds
+
+    rng = random.Random(args.seed + client_id)
+    while not stop.is_set():
+        court_date = rng.choice(court_dates)
+        start = timer.perf_counter()
+        try:
+            fetch_court_times_data_cached(court_date)
+            outcome = 'fresh' if get_stale_court_times_age_seconds(court_date) is None else 'stale'
+        except Exception:
+            outcome = 'error'
+        outcomes.append((outcome, timer.perf_counter() - start))
+        timer.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+def run_scenario(server: FixtureServer, args) -> dict:
+    use_fixture_server(server.url)
+    from courtfinder.constants import PST_TIME_ZONE
+    from courtfinder.fetch import get_circuit_breaker, get_court_times_cache, get_rate_limiter
+    from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime
+
+    get_court_times_cache().ttl_seconds = args.ttl
+    get_circuit_breaker().reset_seconds = args.reset
+    start_date = get_datetime_by_hour(get_default_datetime(), 0, PST_TIME_ZONE)
+    court_dates = [get_datetime_by_hour(start_date + timedelta(days=day), 0, PST_TIME_ZONE) for day in range(args.days)]
+
+    results = []
+    for phase, faults in PHASES:
+        for name, value in faults.items():
+            setattr(server, name, value)
+        upstream_before = server.stats()
+        outcomes = []
+        stop = threading.Event()
+        threads = [threading.Thread(target=run_client, name=f"client-{client_id}", args=(client_id, args, court_dates, stop, outcomes))
+                   for client_id in range(args.clients)]
+        for thread in threads:
+            thread.start()
+        timer.sleep(args.phase_seconds)
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+        upstream_after = server.stats()
+        durations_ms = np.array([duration for _, duration in outcomes]) * 1000
+        results.append({
+            "phase": phase,
+            **faults,
+            "reads": len(outcomes),
+            **{outcome: sum(1 for read_outcome, _ in outcomes if read_outcome == outcome) for outcome in ('fresh', 'stale', 'error')},
+            "latency_ms": {name: round(float(np.percentile(durations_ms, percentile)), 3) if len(durations_ms) else None
+                           for name, percentile in [("p50", 50), ("p95", 95), ("max", 100)]},
+            "upstream": {name: upstream_after[name] - upstream_before[name] for name in upstream_after},
+            "circuit_breaker": get_circuit_breaker().status(),
+            "rate_limiter": get_rate_limiter().status(),
+        })
+    return {
+        "clients": args.clients,
+        "phase_seconds": args.phase_seconds,
+        "cache_ttl_seconds": args.ttl,
+        "circuit_reset_seconds": args.reset,
+        "phases": results,
+        "cache": get_court_times_cache().stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=10, help='Concurrent readers.')
+    parser.add_argument('--phase-seconds', type=float, default=10, help='How long every phase lasts.')
+    parser.add_argument('--think-time', type=float, default=0.1, help='Mean seconds between the reads of a client.')
+    parser.add_argument('--days', type=int, default=3, help='Dates are picked from this many days ahead.')
+    parser.add_argument('--ttl', type=float, default=1, help='Court times cache TTL, short so that entries expire during every phase.')
+    parser.add_argument('--reset', type=float, default=3, help='Seconds the circuit stays open before trying upstream again.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the fixture server takes to respond.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='File to write the results to, stdout otherwise.')
+    args = parser.parse_args()
+
+    with FixtureServer(latency_seconds=args.latency) as server:
+        results = run_scenario(server, args)
+    with open(args.output, 'w') if args.output else sys.stdout as output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
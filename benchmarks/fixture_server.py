@@ -0,0 +1,157 @@
+"""
+Local stand-in for the CourtReserve ReadExpandedApi endpoint.
+
+Serves recorded responses (`<YYYY-MM-DD>.json` files in a recordings directory, as saved by `--record`) and falls
+back to synthetic payloads for any other date, with configurable latency, error rate and throttling. All of them can
+be changed while the server runs, e.g. to simulate an outage.
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from benchmarks.synthetic import generate_court_times_data
+
+
+class FixtureServer:
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency_seconds: float = 0, latency_jitter_seconds: float = 0,
+                 error_rate: float = 0, throttle_rate: float = 0, recordings_dir: str = None):
+        self.latency_seconds = latency_seconds
+        self.latency_jitter_seconds = latency_jitter_seconds
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.recordings_dir = recordings_dir
+        self.request_count = 0
+        self.error_count = 0
+        self.throttled_count = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._create_handler())
+        self._server.daemon_threads = True
+        # Polling more often than the default half a second keeps stop() quick, e.g. between tests
+        self._thread = threading.Thread(target=self._server.serve_forever, kwargs={'poll_interval': 0.05}, name='fixture-server',
+                                        daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/SchedulerApi/ReadExpandedApi"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.request_count, "errors": self.error_count, "throttled": self.throttled_count}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_response_body(self, court_date: date) -> bytes:
+        if self.recordings_dir:
+            recording_path = os.path.join(self.recordings_dir, f"{court_date}.json")
+            if os.path.exists(recording_path):
+                with open(recording_path, 'rb') as f:
+                    return f.read()
+        return json.dumps({"Data": generate_court_times_data(court_date)}).encode()
+
+    def _create_handler(self):
+        fixture_server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Keep-alive, like the real endpoint
+
+            def do_GET(self):
+                with fixture_server._lock:
+                    fixture_server.request_count += 1
+                time.sleep(fixture_server.latency_seconds + random.uniform(0, fixture_server.latency_jitter_seconds))
+                if random.random() < fixture_server.error_rate:
+                    with fixture_server._lock:
+                        fixture_server.error_count += 1
+                    self._respond(503, b'{"error": "injected failure"}')
+                    return
+                if random.random() < fixture_server.throttle_rate:
+                    with fixture_server._lock:
+                        fixture_server.throttled_count += 1
+                    self._respond(429, b'{"error": "injected throttling"}', [('Retry-After', '1')])
+                    return
+                kendo_date = json.loads(parse_qs(urlparse(self.path).query)['jsonData'][0])['KendoDate']
+                self._respond(200, fixture_server.get_response_body(date(kendo_date['Year'], kendo_date['Month'], kendo_date['Day'])))
+
+            def _respond(self, status: int, body: bytes, headers: list = ()):
+                self.send_response(status)
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def use_fixture_server(url: str):
+    """Points courtfinder, already imported or not, at the fixture server instead of CourtReserve."""
+    os.environ['COURT_BOOKINGS_API_URL'] = url
+    import courtfinder.constants
+    import courtfinder.fetch
+
+    courtfinder.constants.COURT_BOOKINGS_API_URL = url
+    courtfinder.fetch.COURT_BOOKINGS_API_URL = url
+
+
+def record(recordings_dir: str, days: int):
+    """Saves the live CourtReserve responses of the next `days` days, to be replayed later."""
+    from courtfinder.constants import PST_TIME_ZONE
+    from courtfinder.fetch import fetch_court_times_data
+    from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime
+    from datetime import timedelta
+
+    os.makedirs(recordings_dir, exist_ok=True)
+    for day in range(days):
+        court_date = get_datetime_by_hour(get_default_datetime() + timedelta(days=day), 0, PST_TIME_ZONE)
+        with open(os.path.join(recordings_dir, f"{court_date.date()}.json"), 'w') as f:
+            json.dump({"Data": fetch_court_times_data(court_date)}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0, help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0, help='Up to this many extra seconds, uniformly random.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of requests failing with a 503.')
+    parser.add_argument('--throttle-rate', type=float, default=0, help='Fraction of requests throttled with a 429.')
+    parser.add_argument('--recordings', help='Directory of recorded responses.')
+    parser.add_argument('--record', type=int, metavar='DAYS', help='Record the next DAYS days from CourtReserve into --recordings and exit.')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.recordings, args.record)
+        return
+    server = FixtureServer(port=args.port, latency_seconds=args.latency, latency_jitter_seconds=args.jitter,
+                           error_rate=args.error_rate, throttle_rate=args.throttle_rate, recordings_dir=args.recordings)
+    print(f"Serving on {server.url}, run the app with COURT_BOOKINGS_API_URL={server.url}")
+    server.start()
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
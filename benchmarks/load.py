@@ -0,0 +1,118 @@
+"""
+Load test simulating concurrent app sessions against the fixture server, reported as JSON.
+
+Every session is a thread rerunning the app's data path, now and then changing the date, locations or time range
+like a user would, so that reruns share the process-wide court times cache the way real sessions do.
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time as timer
+import traceback
+from datetime import time, timedelta
+
+import numpy as np
+
+from benchmarks.fixture_server import FixtureServer, use_fixture_server
+
+
+def pick_filters(rng: random.Random, start_date, days: int, all_locations: list) -> tuple:
+    court_date = start_date + timedelta(days=rng.randrange(days))
+    locations = rng.sample(all_locations, rng.randint(1, len(all_locations)))
+    start_hour = rng.randint(6, 20)
+    return court_date, locations, time(start_hour), time(min(start_hour + rng.choice([1, 2]), 22))
+
+
+def run_session(app, session_state, session_id: int, args, start_date, all_locations: list, durations: list, errors: list):
+    from benchmarks.sessions import new_session_state, rerun, set_filters
+
+    rng = random.Random(args.seed + session_id)
+    state = new_session_state(*pick_filters(rng, start_date, args.days, all_locations))
+    for _ in range(args.reruns):
+        if rng.random() < args.change_rate:
+            set_filters(state, *pick_filters(rng, start_date, args.days, all_locations))
+        start = timer.perf_counter()
+        try:
+            rerun(app, session_state, state)
+            durations.append(timer.perf_counter() - start)
+        except Exception:
+            errors.append(traceback.format_exc(limit=1))
+        timer.sleep(rng.uniform(0, 2 * args.think_time))
+
+
+def run_load_test(server: FixtureServer, args) -> dict:
+    use_fixture_server(server.url)
+    from benchmarks.sessions import install_session_state
+    from courtfinder.constants import BBCLocation, PST_TIME_ZONE
+    from courtfinder.fetch import get_court_times_cache, get_court_times_session
+    from courtfinder.prefetch import PrefetchScheduler
+    from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime
+
+    app, session_state = install_session_state()
+    start_date = get_datetime_by_hour(get_default_datetime(), 0, PST_TIME_ZONE).date()
+    prefetch_scheduler = None
+    if args.prefetch:
+        prefetch_scheduler = PrefetchScheduler(get_court_times_cache(), get_court_times_session(), days=args.days)
+        prefetch_scheduler.start()
+
+    durations = []
+    errors = []
+    threads = [threading.Thread(target=run_session, name=f"session-{session_id}",
+                                args=(app, session_state, session_id, args, start_date, BBCLocation.get_all_locations(), durations, errors))
+               for session_id in range(args.sessions)]
+    start = timer.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = timer.perf_counter() - start
+    if prefetch_scheduler:
+        prefetch_scheduler.stop()
+
+    durations_ms = np.array(durations) * 1000
+    return {
+        "sessions": args.sessions,
+        "reruns_per_session": args.reruns,
+        "upstream_latency_seconds": args.latency,
+        "upstream_error_rate": args.error_rate,
+        "prefetch": args.prefetch,
+        "elapsed_seconds": round(elapsed, 3),
+        "reruns": len(durations),
+        "failed_reruns": len(errors),
+        "throughput_reruns_per_second": round(len(durations) / elapsed, 1),
+        "latency_ms": {name: round(float(np.percentile(durations_ms, percentile)), 3) if len(durations_ms) else None
+                       for name, percentile in [("p50", 50), ("p95", 95), ("p99", 99), ("max", 100)]},
+        "upstream": server.stats(),
+        "cache": get_court_times_cache().stats(),
+        "sample_errors": sorted(set(errors))[:3],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sessions', type=int, default=20, help='Concurrent sessions.')
+    parser.add_argument('--reruns', type=int, default=10, help='Reruns per session.')
+    parser.add_argument('--think-time', type=float, default=0.2, help='Mean seconds between the reruns of a session.')
+    parser.add_argument('--change-rate', type=float, default=0.5, help='Chance a rerun comes with new filters.')
+    parser.add_argument('--days', type=int, default=7, help='Dates are picked from this many days ahead.')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the fixture server takes to respond.')
+    parser.add_argument('--jitter', type=float, default=0.1, help='Up to this many extra seconds of latency.')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of upstream requests failing.')
+    parser.add_argument('--prefetch', action='store_true', help='Run the prefetch scheduler during the test.')
+    parser.add_argument('--recordings', help='Directory of recorded responses, synthetic payloads otherwise.')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='File to write the results to, stdout otherwise.')
+    args = parser.parse_args()
+
+    with FixtureServer(latency_seconds=args.latency, latency_jitter_seconds=args.jitter, error_rate=args.error_rate,
+                       recordings_dir=args.recordings) as server:
+        results = run_load_test(server, args)
+    with open(args.output, 'w') if args.output else sys.stdout as output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Micro-benchmarks of the availability hot path, reported as JSON."""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time as timer
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+from benchmarks.fixture_server import FixtureServer, use_fixture_server
+from benchmarks.synthetic import COURT_COUNT_BY_LOCATION, generate_court_times_data
+from courtfinder.constants import CLUB_OPENING_HOURS, PST_TIME_ZONE
+from courtfinder.links import get_court_link
+from courtfinder.timeutils import get_court_number, get_datetime_by_hour, get_last_court_start_time
+
+
+def benchmark(func, rounds: int, warmup_rounds: int = 2, setup=None) -> dict:
+    """Times `rounds` calls of `func`, after `warmup_rounds` untimed calls. `setup` runs untimed before every call."""
+    durations = []
+    for round_index in range(warmup_rounds + rounds):
+        if setup:
+            setup()
+        start = timer.perf_counter()
+        func()
+        if round_index >= warmup_rounds:
+            durations.append(timer.perf_counter() - start)
+    return {
+        "rounds": rounds,
+        "min_ms": round(min(durations) * 1000, 3),
+        "max_ms": round(max(durations) * 1000, 3),
+        "mean_ms": round(statistics.mean(durations) * 1000, 3),
+        "median_ms": round(statistics.median(durations) * 1000, 3),
+        "stddev_ms": round(statistics.stdev(durations) * 1000, 3) if rounds > 1 else 0.0,
+    }
+
+
+def get_df_by_location_reference(court_date: datetime, available_court_times_by_location: dict) -> dict:
+    """The per-location tables as app.py used to build them on every rerun, writing each free run with .loc."""
+    df_by_location = {}
+    for location, court_times_by_court_number in available_court_times_by_location.items():
+        start_time = get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[0], PST_TIME_ZONE)
+        end_time = get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[1], PST_TIME_ZONE)
+        intervals = pd.date_range(start=start_time, end=get_last_court_start_time(end_time), freq='30min')
+        df = pd.DataFrame(index=intervals, columns=sorted(court_times_by_court_number.keys(), key=get_court_number))
+        for court, times in court_times_by_court_number.items():
+            for start, end in times:
+                link = get_court_link(location, start)
+                text = f"✓ {start.strftime('%I:%M %p')}"
+                df.loc[(df.index >= start) & (df.index < end), court] = f"{link}&{text}"
+        df.index = df.index.strftime('%I:%M %p')
+        df_by_location[location] = df
+    return df_by_location
+
+
+def get_compact_view_reference(df_by_location: dict, locations: list, start_time: datetime, end_time: datetime) -> pd.DataFrame:
+    """The compact view as app.py used to build it on every rerun, reading and writing each cell with .loc/.at."""
+    intervals = pd.date_range(start=start_time, end=get_last_court_start_time(end_time), freq='30min')
+    columns = sorted(locations + [location + ' Reserve' for location in locations])
+    compact_view_df = pd.DataFrame(index=intervals, columns=columns)
+    for location in locations:
+        single_location_df = df_by_location[location]
+        for index in compact_view_df.index:
+            available_courts = []
+            for court_number in single_location_df.columns:
+                if not pd.isnull(single_location_df.loc[index.strftime('%I:%M %p'), court_number]):
+                    available_courts.append(court_number)
+            if available_courts:
+                compact_view_df.at[index, location + ' Reserve'] = get_court_link(location, index)
+            compact_view_df.at[index, location] = available_courts
+    compact_view_df.index = compact_view_df.index.strftime('%I:%M %p')
+    return compact_view_df
+
+
+def run_benchmarks(server_url: str, rounds: int) -> dict:
+    use_fixture_server(server_url)
+    from benchmarks.sessions import install_session_state, new_session_state, rerun
+    from courtfinder.availability import compute_available_court_times_by_location, parse_reservations
+    from courtfinder.constants import BBCLocation
+    from courtfinder.fetch import (fetch_court_times_data, fetch_court_times_data_cached, get_available_court_times_by_location,
+                                   get_court_times_cache, get_court_times_cache_key, get_court_times_session)
+    from courtfinder.timeutils import get_default_datetime
+
+    app, session_state = install_session_state()
+    court_date = get_datetime_by_hour(get_default_datetime() + timedelta(days=1), 0, PST_TIME_ZONE)
+    court_times = generate_court_times_data(court_date.date())
+    court_times_by_date = {court_date + timedelta(days=day): generate_court_times_data(court_date.date() + timedelta(days=day)) for day in range(30)}
+    month_of_court_times = [item for court_times_of_date in court_times_by_date.values() for item in court_times_of_date]
+    state = new_session_state(court_date.date(), BBCLocation.get_default_locations(), time(18), time(20))
+    rerun(app, session_state, state)
+
+    def invalidate_courts_for_date():
+        state.court_times = None
+
+    def invalidate_compact_view():
+        state.compact_view_key = None
+
+    def invalidate_rerun():
+        # A refetched payload, so that availability gets computed again as well
+        get_court_times_cache().put(get_court_times_cache_key(court_date), list(fetch_court_times_data_cached(court_date)))
+
+    def rerun_reference():
+        # Before: both views rebuilt from the cached payload on every rerun, whether anything changed or not
+        available_court_times_by_location = compute_available_court_times_by_location(court_date, fetch_court_times_data_cached(court_date))
+        df_by_location = get_df_by_location_reference(court_date, available_court_times_by_location)
+        get_compact_view_reference(df_by_location, state.locations_filter, *state.time_range_filter)
+
+    session = get_court_times_session()
+    court_count = sum(COURT_COUNT_BY_LOCATION.values())
+    return {
+        "fetch_court_times_data": benchmark(lambda: fetch_court_times_data(court_date, session), rounds),
+        "compute_available_court_times_by_location": benchmark(lambda: compute_available_court_times_by_location(court_date, court_times), rounds),
+        "get_available_court_times_by_location[cached]": benchmark(lambda: get_available_court_times_by_location(court_date), rounds),
+        "parse_reservations[30 days]": benchmark(lambda: parse_reservations(month_of_court_times), rounds),
+        f"compute_available_court_times_by_location[30 days, {len(month_of_court_times)} reservations]": benchmark(
+            lambda: [compute_available_court_times_by_location(date_of_court_times, court_times_of_date)
+                     for date_of_court_times, court_times_of_date in court_times_by_date.items()], rounds),
+        "update_available_courts_for_date": benchmark(app.update_available_courts_for_date, rounds, setup=invalidate_courts_for_date),
+        "update_available_courts_for_date[unchanged]": benchmark(app.update_available_courts_for_date, rounds),
+        "update_compact_view_available_court_times": benchmark(app.update_compact_view_available_court_times, rounds, setup=invalidate_compact_view),
+        "update_compact_view_available_court_times[unchanged]": benchmark(app.update_compact_view_available_court_times, rounds),
+        # Rerun latency before and after building the views from the availability bitmasks, for every court
+        f"rerun[before, .loc/.at, {court_count} courts]": benchmark(rerun_reference, rounds),
+        f"rerun[after, new payload, {court_count} courts]": benchmark(lambda: rerun(app, session_state, state), rounds, setup=invalidate_rerun),
+        f"rerun[after, unchanged, {court_count} courts]": benchmark(lambda: rerun(app, session_state, state), rounds),
+        "get_location_dataframe": benchmark(lambda: app.get_location_dataframe(state.court_availability, state.full_day_location), rounds),
+        # Cold start of the CLI in a new interpreter, including the interpreter's own startup
+        "python -m courtfinder --help": benchmark(lambda: subprocess.run([sys.executable, '-m', 'courtfinder', '--help'],
+                                                                          stdout=subprocess.DEVNULL, check=True), rounds),
+        "python -c pass": benchmark(lambda: subprocess.run([sys.executable, '-c', 'pass'], check=True), rounds),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--recordings', help='Directory of recorded responses, synthetic payloads otherwise.')
+    parser.add_argument('--output', help='File to write the results to, stdout otherwise.')
+    args = parser.parse_args()
+
+    with FixtureServer(recordings_dir=args.recordings) as server:
+        results = {"date": str(date.today()), "python": sys.version.split()[0], "benchmarks": run_benchmarks(server.url, args.rounds)}
+    with open(args.output, 'w') if args.output else sys.stdout as output:
+        json.dump(results, output, indent=2)
+        output.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Drives the per-rerun data path of app.py outside of a Streamlit runtime.
+
+`st.session_state` only works inside a script run, so it gets swapped for a proxy that resolves to the state of
+whichever simulated session is running on the current thread. Rendering is not exercised.
+"""
+import threading
+from datetime import date, datetime, time
+from zoneinfo import ZoneInfo
+
+from courtfinder.constants import PST_TIME_ZONE
+
+
+class SessionState(dict):
+    def __getattr__(self, key):
+        try:
+            return self[key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def __setattr__(self, key, value):
+        self[key] = value
+
+
+class ThreadLocalSessionState(threading.local):
+    state = None
+
+    def __getattr__(self, key):
+        return getattr(self.state, key)
+
+    def __setattr__(self, key, value):
+        if key == 'state':
+            super().__setattr__(key, value)
+        else:
+            setattr(self.state, key, value)
+
+
+def install_session_state():
+    """Imports app.py with `st.session_state` replaced, returning (app module, thread-local session state)."""
+    import app
+
+    session_state = ThreadLocalSessionState()
+    app.st.session_state = session_state
+    # st.cache_resource only caches within a Streamlit runtime, share one snapshot store across sessions like it does
+    snapshot_store = app.get_availability_snapshot_store()
+    app.get_availability_snapshot_store = lambda: snapshot_store
+    return app, session_state
+
+
+def new_session_state(court_date: date, locations: list, start_time: time, end_time: time) -> SessionState:
+    # Same initial values as main()
+    state = SessionState(locations_filter=[], time_range_filter=(), date_input_datetime=None, compact_view_df=None,
+                         compact_view_key=None, court_times=None, court_availability=None, court_occupancy_date=None,
+                         court_occupancy_version=0, full_day_location=None)
+    set_filters(state, court_date, locations, start_time, end_time)
+    return state
+
+
+def set_filters(state: SessionState, court_date: date, locations: list, start_time: time, end_time: time):
+    state.date_input_datetime = datetime.combine(court_date, datetime.min.time(), tzinfo=ZoneInfo(PST_TIME_ZONE))
+    state.locations_filter = list(locations)
+    state.full_day_location = locations[0] if locations else None  # Like a user opening one full-day table
+    state.time_range_filter = (datetime.combine(court_date, start_time, tzinfo=ZoneInfo(PST_TIME_ZONE)),
+                               datetime.combine(court_date, end_time, tzinfo=ZoneInfo(PST_TIME_ZONE)))
+
+
+def rerun(app, session_state: ThreadLocalSessionState, state: SessionState):
+    """What a rerun of main() computes once the widgets have been read, up to the DataFrames it renders."""
+    session_state.state = state
+    app.update_available_courts_for_date()
+    app.update_compact_view_available_court_times()
+    if state.full_day_location in state.court_availability.courts_by_location:
+        app.get_location_dataframe(state.court_availability, state.full_day_location)
@@ -0,0 +1,37 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from courtfinder.constants import BBCLocation, CLUB_OPENING_HOURS, PST_TIME_ZONE
+
+COURT_COUNT_BY_LOCATION = {
+    BBCLocation.BELLEVUE.value: 15,
+    BBCLocation.MUKILTEO.value: 12,
+    BBCLocation.RENTON.value: 10,
+    BBCLocation.MUKILTEO_PICKLEBALL.value: 6,
+}
+
+
+def generate_court_times_data(court_date: date, occupancy_rate: float = 0.4, seed: int = 0) -> list:
+    """Generates a deterministic ReadExpandedApi `Data` payload for `court_date` with roughly `occupancy_rate` of slots reserved."""
+    rng = random.Random(court_date.toordinal() * 1000 + seed)
+    closing = datetime.combine(court_date, datetime.min.time(), tzinfo=ZoneInfo(PST_TIME_ZONE)) + timedelta(hours=CLUB_OPENING_HOURS[1])
+    court_times = []
+    for location, court_count in COURT_COUNT_BY_LOCATION.items():
+        for court_number in range(1, court_count + 1):
+            start = datetime.combine(court_date, datetime.min.time(), tzinfo=ZoneInfo(PST_TIME_ZONE)) + timedelta(hours=CLUB_OPENING_HOURS[0])
+            while start < closing:
+                if rng.random() < occupancy_rate:
+                    end = min(start + timedelta(minutes=rng.choice([30, 60, 90, 120])), closing)
+                    court_times.append({
+                        "CourtLabel": f"{location} {court_number}",
+                        "Start": start.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        "End": end.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+                        # Mostly regular reservations, with a few of the hidden entries that get filtered out
+                        "EventOnlineSignUpOff": rng.random() < 0.95,
+                        "CanSignUpToEvent": False,
+                        "RegistrationOpen": False,
+                    })
+                    start = end
+                start += timedelta(minutes=30)
+    return court_times
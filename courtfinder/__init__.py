@@ -0,0 +1,6 @@
+"""
+Court availability core of BBC Court Finder: fetching CourtReserve scheduler data and computing open courts.
+
+None of it depends on Streamlit or pandas, and submodules are only imported on demand so that simple queries
+(e.g. `python -m courtfinder`) start quickly.
+"""
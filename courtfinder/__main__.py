@@ -0,0 +1,5 @@
+import sys
+
+from courtfinder.cli import main
+
+sys.exit(main())
@@ -0,0 +1,241 @@
+"""
+Historical court utilization, i.e. how often every court is reserved per weekday and slot, to find the location, court
+and time combinations that are reliably free.
+
+Aggregates are built from the CourtTimesHistory payloads or from fetched scheduler payloads, and only ever process
+what's new: history is append-only, so every update only reads the payloads appended since the last one.
+"""
+import os
+import threading
+from datetime import date, datetime
+
+import numpy as np
+
+from courtfinder.availability import get_reserved_slots, parse_reservations
+from courtfinder.constants import CLUB_OPENING_HOURS, PST_TIME_ZONE
+from courtfinder.history import RESERVATION_RECORD_DTYPE, CourtTimesHistory, get_record_courts, is_shown_record
+from courtfinder.metrics import timed
+from courtfinder.timeutils import get_court_number, get_datetime_by_hour, get_epoch_minutes
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+class UtilizationAggregates:
+    """
+    Per (weekday, court, slot) counts of the days a slot was reserved, out of the days its location was observed.
+
+    The reserved slots of every date are kept as well, from the last payload fetched for it, so that a date fetched
+    again replaces its previous contribution instead of requiring a full recomputation. Only completed days, i.e.
+    before `today`, are counted, as upcoming days still fill up.
+    """
+
+    def __init__(self, slot_minutes: int = 30):
+        self.slot_minutes = slot_minutes
+        self.slot_count = (CLUB_OPENING_HOURS[1] - CLUB_OPENING_HOURS[0]) * 60 // slot_minutes
+        self.courts = []  # (location, court name), in order of first appearance
+        self.locations = []
+        self.processed_payloads = 0  # History payloads already aggregated
+        self.date_ordinals = np.empty(0, dtype=np.int32)  # Sorted
+        self.fetched_at = np.empty(0, dtype=np.int64)  # Seconds since the epoch of the payload each date comes from
+        self.counted = np.empty(0, dtype=bool)  # Whether the date is included in the counts
+        self.reserved = np.zeros((0, 0, self.slot_count), dtype=bool)  # (dates, courts, slots)
+        self.observed = np.zeros((0, 0), dtype=bool)  # (dates, locations)
+        self.reserved_days = np.zeros((7, 0, self.slot_count), dtype=np.int32)  # (weekdays, courts, slots)
+        self.observed_days = np.zeros((7, 0), dtype=np.int32)  # (weekdays, locations)
+        self._court_indices = {}
+        self._location_indices = {}
+        self._lock = threading.Lock()
+
+    @timed()
+    def update_from_history(self, history: CourtTimesHistory, today: date) -> int:
+        """Aggregates the payloads appended to `history` since the last update. Returns the number of updated dates."""
+        with self._lock:
+            all_payloads = history.read_payloads()
+            payloads = all_payloads[self.processed_payloads:]
+            labels = history.get_labels()
+            counts = payloads['count'].astype(np.intp)
+            record_payloads = np.repeat(np.arange(len(payloads)), counts)
+            record_indices = np.arange(counts.sum()) + np.repeat(payloads['offset'] - (np.cumsum(counts) - counts), counts)
+            records = history.read()[record_indices] if len(record_indices) else np.empty(0, dtype=RESERVATION_RECORD_DTYPE)
+            shown = is_shown_record(records)
+            records, record_payloads = records[shown], record_payloads[shown]
+            courts, record_courts = get_record_courts(records, labels)
+            updated_dates = self._add_payloads(payloads['court_date'], payloads['fetched_at'], record_payloads, courts,
+                                               record_courts, records['start'], records['end'])
+            self.processed_payloads = len(all_payloads)
+            self._count_completed_days(today)
+            return updated_dates
+
+    def add_court_times(self, court_date: date, court_times: list, fetched_at: datetime, today: date) -> int:
+        """Aggregates a fetched scheduler payload, replacing the one of `court_date` if it is more recent."""
+        with self._lock:
+            reservations = parse_reservations(court_times)
+            updated_dates = self._add_payloads(np.array([court_date.toordinal()], dtype=np.int32),
+                                               np.array([int(fetched_at.timestamp())], dtype=np.int64),
+                                               np.zeros(len(reservations.court_ids), dtype=np.intp),
+                                               reservations.courts, reservations.court_ids, reservations.starts, reservations.ends)
+            self._count_completed_days(today)
+            return updated_dates
+
+    def has_date(self, court_date: date) -> bool:
+        with self._lock:
+            index = np.searchsorted(self.date_ordinals, court_date.toordinal())
+            return index < len(self.date_ordinals) and self.date_ordinals[index] == court_date.toordinal()
+
+    def get_court_utilization(self, location: str) -> tuple:
+        """
+        Returns the courts of `location` sorted by number, and the fraction of days each of their slots was reserved
+        as a (weekdays, courts, slots) array, NaN for weekdays without any observed day.
+        """
+        with self._lock:
+            court_indices = sorted((index for index, (court_location, _) in enumerate(self.courts) if court_location == location),
+                                   key=lambda index: get_court_number(self.courts[index][1]))
+            days = self._get_observed_days(location)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                utilization = self.reserved_days[:, court_indices, :] / days[:, np.newaxis, np.newaxis]
+            return tuple(self.courts[index][1] for index in court_indices), utilization
+
+    def get_location_utilization(self, location: str) -> np.ndarray:
+        """Fraction of the courts of `location` reserved per weekday and slot, as a (weekdays, slots) array."""
+        _, utilization = self.get_court_utilization(location)
+        if utilization.shape[1] == 0:
+            return np.full((7, self.slot_count), np.nan)
+        return utilization.mean(axis=1)
+
+    def get_observed_days(self, location: str) -> np.ndarray:
+        """Number of completed days aggregated per weekday for `location`."""
+        with self._lock:
+            return self._get_observed_days(location)
+
+    def get_slot_labels(self) -> list:
+        return [f"{CLUB_OPENING_HOURS[0] + slot * self.slot_minutes // 60:02d}:{slot * self.slot_minutes % 60:02d}"
+                for slot in range(self.slot_count)]
+
+    def save(self, path: str):
+        with self._lock:
+            # Written next to the destination and moved over it, so that readers never see a partial file
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, slot_minutes=self.slot_minutes, processed_payloads=self.processed_payloads,
+                         courts=np.array(self.courts, dtype=str).reshape(-1, 2), locations=np.array(self.locations, dtype=str),
+                         date_ordinals=self.date_ordinals, fetched_at=self.fetched_at, counted=self.counted,
+                         reserved=self.reserved, observed=self.observed,
+                         reserved_days=self.reserved_days, observed_days=self.observed_days)
+            os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str):
+        with np.load(path) as saved:
+            aggregates = cls(int(saved['slot_minutes']))
+            # Saved before the history had a payload index, all of it gets aggregated again, which replaces nothing
+            aggregates.processed_payloads = int(saved['processed_payloads']) if 'processed_payloads' in saved else 0
+            aggregates.courts = [tuple(court) for court in saved['courts'].tolist()]
+            aggregates.locations = saved['locations'].tolist()
+            for name in ('date_ordinals', 'fetched_at', 'counted', 'reserved', 'observed', 'reserved_days', 'observed_days'):
+                setattr(aggregates, name, saved[name])
+        aggregates._court_indices = {court: index for index, court in enumerate(aggregates.courts)}
+        aggregates._location_indices = {location: index for index, location in enumerate(aggregates.locations)}
+        return aggregates
+
+    def _get_observed_days(self, location: str) -> np.ndarray:
+        location_index = self._location_indices.get(location)
+        return self.observed_days[:, location_index] if location_index is not None else np.zeros(7, dtype=np.int32)
+
+    def _add_payloads(self, payload_dates: np.ndarray, payload_fetched_at: np.ndarray, record_payloads: np.ndarray, courts: list,
+                      record_courts: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> int:
+        # Only the last payload of every date matters, and only if it is newer than the one already aggregated.
+        # Of payloads fetched in the same second, the last one wins.
+        dates, payload_date_indices = np.unique(payload_dates, return_inverse=True)
+        payload_date_indices = payload_date_indices.reshape(-1)
+        latest_fetched_at = np.full(len(dates), np.iinfo(np.int64).min)
+        np.maximum.at(latest_fetched_at, payload_date_indices, payload_fetched_at)
+        latest_payloads = np.full(len(dates), -1, dtype=np.intp)
+        is_latest = payload_fetched_at == latest_fetched_at[payload_date_indices]
+        np.maximum.at(latest_payloads, payload_date_indices[is_latest], np.flatnonzero(is_latest))
+        record_date_indices = payload_date_indices[record_payloads]
+        existing_indices = np.zeros(len(dates), dtype=np.intp)
+        existing = np.zeros(len(dates), dtype=bool)
+        stored_fetched_at = np.full(len(dates), np.iinfo(np.int64).min)
+        if len(self.date_ordinals):
+            existing_indices = np.minimum(np.searchsorted(self.date_ordinals, dates), len(self.date_ordinals) - 1)
+            existing = self.date_ordinals[existing_indices] == dates
+            stored_fetched_at[existing] = self.fetched_at[existing_indices[existing]]
+        newer = latest_fetched_at > stored_fetched_at
+        if not newer.any():
+            return 0
+
+        court_indices = np.array([self._intern_court(court) for court in courts], dtype=np.intp)
+        self._grow(len(self.courts), len(self.locations))
+        updated_dates = dates[newer]
+        updated_date_indices = np.full(len(dates), -1, dtype=np.intp)
+        updated_date_indices[newer] = np.arange(len(updated_dates))
+        selected = newer[record_date_indices] & (record_payloads == latest_payloads[record_date_indices])
+        rows = updated_date_indices[record_date_indices[selected]]
+        columns = court_indices[record_courts[selected]]
+
+        # All the updated dates at once, with a row per (date, court)
+        opening_minutes = np.array([get_epoch_minutes(get_datetime_by_hour(date.fromordinal(ordinal), CLUB_OPENING_HOURS[0], PST_TIME_ZONE))
+                                    for ordinal in updated_dates.tolist()], dtype=np.int64)[rows]
+        reserved = get_reserved_slots(rows * len(self.courts) + columns, len(updated_dates) * len(self.courts), starts[selected],
+                                      ends[selected], opening_minutes, self.slot_count, self.slot_minutes)
+        reserved = reserved.reshape(len(updated_dates), len(self.courts), self.slot_count)
+        observed = np.zeros((len(updated_dates), len(self.locations)), dtype=bool)
+        location_indices = np.array([self._location_indices[location] for location, _ in self.courts], dtype=np.intp)
+        observed[rows, location_indices[columns]] = True
+
+        # Dates aggregated before are replaced in place, after taking their previous payload out of the counts
+        replaced = existing[newer]
+        replaced_indices = existing_indices[newer][replaced]
+        self._uncount(replaced_indices[self.counted[replaced_indices]])
+        self.reserved[replaced_indices] = reserved[replaced]
+        self.observed[replaced_indices] = observed[replaced]
+        self.fetched_at[replaced_indices] = latest_fetched_at[newer][replaced]
+
+        added = ~replaced
+        self.date_ordinals = np.concatenate([self.date_ordinals, updated_dates[added].astype(np.int32)])
+        self.fetched_at = np.concatenate([self.fetched_at, latest_fetched_at[newer][added]])
+        self.counted = np.concatenate([self.counted, np.zeros(added.sum(), dtype=bool)])
+        self.reserved = np.concatenate([self.reserved, reserved[added]])
+        self.observed = np.concatenate([self.observed, observed[added]])
+        order = np.argsort(self.date_ordinals, kind='stable')
+        for name in ('date_ordinals', 'fetched_at', 'counted', 'reserved', 'observed'):
+            setattr(self, name, getattr(self, name)[order])
+        return len(updated_dates)
+
+    def _count_completed_days(self, today: date):
+        indices = np.flatnonzero(~self.counted & (self.date_ordinals < today.toordinal()))
+        weekdays = get_weekdays(self.date_ordinals[indices])
+        np.add.at(self.reserved_days, weekdays, self.reserved[indices].astype(np.int32))
+        np.add.at(self.observed_days, weekdays, self.observed[indices].astype(np.int32))
+        self.counted[indices] = True
+
+    def _uncount(self, indices: np.ndarray):
+        weekdays = get_weekdays(self.date_ordinals[indices])
+        np.subtract.at(self.reserved_days, weekdays, self.reserved[indices].astype(np.int32))
+        np.subtract.at(self.observed_days, weekdays, self.observed[indices].astype(np.int32))
+        self.counted[indices] = False
+
+    def _intern_court(self, court: tuple) -> int:
+        court_index = self._court_indices.get(court)
+        if court_index is None:
+            court_index = self._court_indices[court] = len(self.courts)
+            self.courts.append(court)
+            if court[0] not in self._location_indices:
+                self._location_indices[court[0]] = len(self.locations)
+                self.locations.append(court[0])
+        return court_index
+
+    def _grow(self, court_count: int, location_count: int):
+        # New courts and locations start out never reserved nor observed on the dates aggregated before them
+        court_padding = court_count - self.reserved.shape[1]
+        location_padding = location_count - self.observed.shape[1]
+        if court_padding:
+            self.reserved = np.pad(self.reserved, ((0, 0), (0, court_padding), (0, 0)))
+            self.reserved_days = np.pad(self.reserved_days, ((0, 0), (0, court_padding), (0, 0)))
+        if location_padding:
+            self.observed = np.pad(self.observed, ((0, 0), (0, location_padding)))
+            self.observed_days = np.pad(self.observed_days, ((0, 0), (0, location_padding)))
+
+
+def get_weekdays(date_ordinals: np.ndarray) -> np.ndarray:
+    # date.fromordinal(1) is a Monday
+    return (date_ordinals.astype(np.intp) - 1) % 7
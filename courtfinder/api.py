@@ -0,0 +1,246 @@
+"""
+JSON availability API for tools that need the same data as the app, served from the shared court times cache:
+
+    GET /availability?date=2024-05-01&locations=Bellevue,Renton&start=7PM&end=9PM
+
+Responses carry a strong ETag derived from their content, so pollers sending `If-None-Match` get an empty 304 until
+availability actually changes. Court times served past their expiry because CourtReserve is failing are marked with
+`Age` and `Warning: 110` headers. `app` is a plain ASGI application, run it with any ASGI server, e.g.
+
+    python -m courtfinder.api --port 8000
+    uvicorn courtfinder.api:app --port 8000
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from datetime import date, time
+from urllib.parse import parse_qs
+
+from courtfinder.availability import CourtAvailability, iterate_set_bits
+from courtfinder.constants import (API_COMPRESSION_MIN_BYTES, API_RESPONSE_CACHE_MAX_ENTRIES, BBCLocation, CLUB_OPENING_HOURS,
+                                   COURT_TIMES_REQUEST_TIMEOUT_SECONDS, PST_TIME_ZONE)
+from courtfinder.fetch import (fetch_court_times_data_cached, get_court_times_cache, get_court_times_session,
+                               get_stale_court_times_age_seconds)
+from courtfinder.metrics import PROMETHEUS_CONTENT_TYPE, get_metrics_registry, timed
+from courtfinder.prefetch import PrefetchScheduler
+from courtfinder.snapshots import AvailabilitySnapshotStore
+from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime, parse_time, validate_time_range
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPE = b'application/json'
+STALE_WARNING = b'110 - "Response is Stale"'
+
+
+class BadRequest(ValueError):
+    pass
+
+
+class AvailabilityResponse:
+    __slots__ = ('court_times', 'body', 'etag', 'gzip_body', 'gzip_etag')
+
+    def __init__(self, court_times: list, body: bytes):
+        self.court_times = court_times  # Scheduler payload the body was rendered from
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'.encode()
+        self.gzip_body = None
+        self.gzip_etag = None
+        if len(body) >= API_COMPRESSION_MIN_BYTES:
+            # mtime=0 keeps the compressed bytes deterministic
+            self.gzip_body = gzip.compress(body, mtime=0)
+            self.gzip_etag = self.etag[:-1] + b'-gzip"'
+
+
+class AvailabilityApi:
+    """
+    ASGI application serving availability as compact JSON.
+
+    The scheduler payload comes from the process-wide cache, and rendered responses are kept until the cache hands
+    out a different payload for their date, so polling an unchanged date costs a couple of dictionary lookups.
+    """
+
+    def __init__(self, prefetch: bool = False, max_responses: int = API_RESPONSE_CACHE_MAX_ENTRIES,
+                 snapshot_store: AvailabilitySnapshotStore = None):
+        self.prefetch = prefetch
+        self.max_responses = max_responses
+        self.prefetch_scheduler = None
+        self.snapshot_store = snapshot_store or AvailabilitySnapshotStore()  # Where availability is computed once per payload
+        self._responses = OrderedDict()  # (date, locations, start, end) -> AvailabilityResponse, least recently used first
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._handle_lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._handle_http(scope, send)
+
+    async def _handle_lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                if self.prefetch:
+                    self.prefetch_scheduler = PrefetchScheduler(get_court_times_cache(), get_court_times_session())
+                    self.prefetch_scheduler.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.prefetch_scheduler:
+                    self.prefetch_scheduler.stop(timeout=COURT_TIMES_REQUEST_TIMEOUT_SECONDS)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _handle_http(self, scope, send):
+        if scope['method'] not in ('GET', 'HEAD'):
+            await self._send_error(scope, send, 405, "Only GET and HEAD are supported.", [(b'allow', b'GET, HEAD')])
+            return
+        if scope['path'] == '/metrics':
+            await self._send(scope, send, 200, get_metrics_registry().render().encode(),
+                             [(b'content-type', PROMETHEUS_CONTENT_TYPE.encode())])
+            return
+        if scope['path'] != '/availability':
+            await self._send_error(scope, send, 404, f"Unknown path '{scope['path']}', expected /availability.")
+            return
+
+        try:
+            query = parse_availability_query(parse_qs(scope['query_string'].decode('latin-1')))
+        except BadRequest as e:
+            await self._send_error(scope, send, 400, str(e))
+            return
+        try:
+            response = await asyncio.to_thread(self.get_response, *query)
+        except Exception as e:
+            logger.error(f"Unable to get availability for {query} - {type(e).__name__}: {e}")
+            await self._send_error(scope, send, 502, "Unable to get court times from CourtReserve.")
+            return
+
+        request_headers = dict(scope['headers'])
+        use_gzip = response.gzip_body is not None and b'gzip' in request_headers.get(b'accept-encoding', b'')
+        etag = response.gzip_etag if use_gzip else response.etag
+        headers = [(b'etag', etag), (b'cache-control', b'no-cache'), (b'vary', b'Accept-Encoding')]
+        stale_age_seconds = get_stale_court_times_age_seconds(get_datetime_by_hour(query[0], 0, PST_TIME_ZONE))
+        if stale_age_seconds is not None:
+            headers += [(b'age', str(int(stale_age_seconds)).encode()), (b'warning', STALE_WARNING)]
+        if etag_matches(request_headers.get(b'if-none-match'), etag):
+            await self._send(scope, send, 304, b'', headers)
+            return
+        headers.append((b'content-type', JSON_CONTENT_TYPE))
+        if use_gzip:
+            headers.append((b'content-encoding', b'gzip'))
+        await self._send(scope, send, 200, response.gzip_body if use_gzip else response.body, headers)
+
+    @timed('api_get_response')
+    def get_response(self, court_date: date, locations: tuple, start_time: time, end_time: time) -> AvailabilityResponse:
+        court_datetime = get_datetime_by_hour(court_date, 0, PST_TIME_ZONE)
+        court_times = fetch_court_times_data_cached(court_datetime)
+        key = (court_date, locations, start_time, end_time)
+        with self._lock:
+            response = self._responses.get(key)
+            if response is not None and response.court_times is court_times:
+                self._responses.move_to_end(key)
+                return response
+
+        availability = self.snapshot_store.get_for_court_times(court_date, court_times)
+        response = AvailabilityResponse(court_times, render_availability(court_date, availability, locations, start_time, end_time))
+
+        with self._lock:
+            self._responses[key] = response
+            self._responses.move_to_end(key)
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+        return response
+
+    async def _send_error(self, scope, send, status: int, message: str, headers: list = None):
+        body = json.dumps({"error": message}, separators=(',', ':')).encode()
+        await self._send(scope, send, status, body, [(b'content-type', JSON_CONTENT_TYPE)] + (headers or []))
+
+    @staticmethod
+    async def _send(scope, send, status: int, body: bytes, headers: list):
+        if status != 304:  # A 304 has no body of its own to describe
+            headers = headers + [(b'content-length', str(len(body)).encode())]
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if scope['method'] == 'HEAD' else body})
+
+
+def parse_availability_query(params: dict) -> tuple:
+    """Returns (date, locations, start time, end time) from the query parameters, raising BadRequest if invalid."""
+    def get_param(name: str):
+        values = params.get(name)
+        return values[-1] if values else None
+
+    try:
+        court_date = date.fromisoformat(get_param('date')) if get_param('date') else get_default_datetime().date()
+        start_time = parse_time(get_param('start')) if get_param('start') else time(CLUB_OPENING_HOURS[0])
+        end_time = parse_time(get_param('end')) if get_param('end') else time(CLUB_OPENING_HOURS[1])
+        validate_time_range(start_time, end_time)
+    except ValueError as e:
+        raise BadRequest(str(e))
+
+    all_locations = BBCLocation.get_all_locations()
+    if get_param('locations'):
+        locations = tuple(location.strip() for location in get_param('locations').split(','))
+        unknown_locations = [location for location in locations if location not in all_locations]
+        if unknown_locations:
+            raise BadRequest(f"Unknown locations {unknown_locations}, expected any of {all_locations}.")
+    else:
+        locations = tuple(BBCLocation.get_default_locations())
+    return court_date, locations, start_time, end_time
+
+
+def render_availability(court_date: date, availability: CourtAvailability, locations: tuple, start_time: time, end_time: time) -> bytes:
+    """
+    Compact JSON with the courts free for the whole range, and the start times of every free slot per court within
+    the range, e.g. {"date":"2024-05-01","start":"19:00","end":"21:00","free_courts":{"Bellevue":["Court 2"]},
+    "free_slots":{"Bellevue":{"Court 1":["19:00"],"Court 2":["19:00","19:30","20:00","20:30"]}}}
+    """
+    range_mask = availability.get_range_mask(start_time, end_time)
+    free_courts_by_location = availability.get_courts_free_between(start_time, end_time)
+    free_slots_by_location = {}
+    for location in locations:
+        free_slots_by_location[location] = {
+            court: [availability.get_slot_start(slot).strftime('%H:%M') for slot in iterate_set_bits(mask & range_mask)]
+            for court, mask in zip(availability.courts_by_location.get(location, ()), availability.masks_by_location.get(location, ()))
+            if mask & range_mask
+        }
+    return json.dumps({
+        "date": str(court_date),
+        "start": start_time.strftime('%H:%M'),
+        "end": end_time.strftime('%H:%M'),
+        "free_courts": {location: free_courts_by_location.get(location, []) for location in locations},
+        "free_slots": free_slots_by_location,
+    }, separators=(',', ':')).encode()
+
+
+def etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == b'*':
+        return True
+    # If-None-Match uses the weak comparison
+    return any(candidate.strip().removeprefix(b'W/') == etag for candidate in if_none_match.split(b','))
+
+
+app = AvailabilityApi()
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(prog='courtfinder.api', description='Serve the JSON availability API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--prefetch', action='store_true', help='Keep the next days warm in the cache in the background.')
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        parser.error("Serving the API needs an ASGI server, e.g. `pip install uvicorn`.")
+    logging.basicConfig(level=logging.INFO)
+    app.prefetch = args.prefetch
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
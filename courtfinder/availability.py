@@ -0,0 +1,227 @@
+import functools
+import logging
+import operator
+import sys
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from typing import NamedTuple
+
+import numpy as np
+
+from courtfinder.constants import CLUB_OPENING_HOURS, PST_TIME_ZONE
+from courtfinder.metrics import timed
+from courtfinder.timeutils import (generate_intervals_end_time_inclusive, get_court_number, get_datetime_by_hour,
+                                   get_epoch_minutes, get_slot_index)
+
+logger = logging.getLogger(__name__)
+
+
+class Reservations(NamedTuple):
+    """Reserved court times as parallel columns, one entry per reservation."""
+    courts: list  # Distinct (location, court number) pairs, in order of first appearance
+    court_ids: np.ndarray  # Index into courts
+    starts: np.ndarray  # int64 minutes since the epoch
+    ends: np.ndarray  # int64 minutes since the epoch
+
+
+class CourtOccupancy(NamedTuple):
+    """Availability of every court in a day as a boolean (courts x slots) matrix per location."""
+    slot_boundaries: list  # slots + 1 datetimes from opening to closing
+    courts_by_location: dict  # location -> court names sorted by court number, locations in order of first appearance
+    free_by_location: dict  # location -> bool array of shape (courts, slots), True where the court is free
+
+
+class CourtAvailability:
+    """
+    Compact availability of every court in a day, as one int bitmask per court where bit i is set when slot i is free.
+
+    Location and court names are interned and shared across days. Slot times, labels and links are only materialized
+    when asked for.
+    """
+    __slots__ = ('opening', 'slot_minutes', 'slot_count', 'courts_by_location', 'masks_by_location')
+
+    def __init__(self, opening: datetime, slot_minutes: int, slot_count: int, courts_by_location: dict, masks_by_location: dict):
+        self.opening = opening
+        self.slot_minutes = slot_minutes
+        self.slot_count = slot_count
+        self.courts_by_location = courts_by_location  # location -> tuple of court names sorted by court number
+        self.masks_by_location = masks_by_location  # location -> tuple of free slot bitmasks, parallel to the courts
+
+    @classmethod
+    def from_occupancy(cls, occupancy: CourtOccupancy):
+        slot_boundaries = occupancy.slot_boundaries
+        slot_minutes = int((slot_boundaries[1] - slot_boundaries[0]).total_seconds()) // 60 if len(slot_boundaries) > 1 else 30
+        courts_by_location = {}
+        masks_by_location = {}
+        for location, courts in occupancy.courts_by_location.items():
+            packed_rows = np.packbits(occupancy.free_by_location[location], axis=1, bitorder='little')
+            location = sys.intern(location)
+            courts_by_location[location] = tuple(sys.intern(court) for court in courts)
+            masks_by_location[location] = tuple(int.from_bytes(packed_row.tobytes(), 'little') for packed_row in packed_rows)
+        return cls(slot_boundaries[0], slot_minutes, len(slot_boundaries) - 1, courts_by_location, masks_by_location)
+
+    def get_slot_start(self, slot: int) -> datetime:
+        return self.opening + timedelta(minutes=slot * self.slot_minutes)
+
+    def get_slot_times(self, mask: int) -> list:
+        """Returns the (start, end) datetimes of every slot set in `mask`."""
+        return [(self.get_slot_start(slot), self.get_slot_start(slot + 1)) for slot in iterate_set_bits(mask)]
+
+    def get_range_mask(self, start_time: time, end_time: time) -> int:
+        """Returns the bits of every slot overlapping [start_time, end_time)."""
+        first_slot = max(get_slot_index(start_time, self.slot_minutes), 0)
+        end_slot = min(get_slot_index(end_time, self.slot_minutes, round_up=True), self.slot_count)
+        return ((1 << max(end_slot - first_slot, 0)) - 1) << first_slot
+
+    def get_courts_free_between(self, start_time: time, end_time: time) -> dict:
+        """Returns location -> courts that are free for every slot overlapping [start_time, end_time)."""
+        range_mask = self.get_range_mask(start_time, end_time)
+        return {location: [court for court, mask in zip(courts, self.masks_by_location[location]) if mask & range_mask == range_mask]
+                for location, courts in self.courts_by_location.items()}
+
+    def get_any_court_free_mask(self, location: str) -> int:
+        """Returns the slots where at least one court of the location is free."""
+        return functools.reduce(operator.or_, self.masks_by_location.get(location, ()), 0)
+
+    def get_free_matrix(self, location: str) -> np.ndarray:
+        """Unpacks the location back to a bool (courts x slots) array."""
+        masks = self.masks_by_location.get(location, ())
+        byte_count = -(-self.slot_count // 8)
+        packed_rows = np.frombuffer(b''.join(mask.to_bytes(byte_count, 'little') for mask in masks), dtype=np.uint8)
+        return np.unpackbits(packed_rows.reshape(len(masks), byte_count), axis=1, count=self.slot_count, bitorder='little').astype(bool)
+
+
+def compute_available_court_times_by_location(court_date: datetime, court_times: list, slot_minutes: int = 30) -> dict:
+    occupancy = get_court_occupancy(court_date, parse_reservations(court_times), slot_minutes)
+    return get_available_court_times_from_occupancy(occupancy)
+
+
+@timed()
+def parse_reservations(court_times: list) -> Reservations:
+    court_ids = []
+    starts = []
+    ends = []
+    court_id_by_label = {}
+    court_id_by_court = {}
+    for item in court_times:
+        if not is_shown_on_court_reserve(item["EventOnlineSignUpOff"], item["CanSignUpToEvent"], item["RegistrationOpen"]):
+            continue
+
+        court_label = item["CourtLabel"]
+        court_id = court_id_by_label.get(court_label)
+        if court_id is None:
+            court = parse_court_label(court_label)
+            court_id = court_id_by_label[court_label] = court_id_by_court.setdefault(court, len(court_id_by_court))
+        court_ids.append(court_id)
+        starts.append(item["Start"])
+        ends.append(item["End"])
+    return Reservations(list(court_id_by_court), np.array(court_ids, dtype=np.intp),
+                        parse_epoch_minutes(starts), parse_epoch_minutes(ends))
+
+
+@timed()
+def get_court_occupancy(court_date: datetime, reservations: Reservations, slot_minutes: int = 30) -> CourtOccupancy:
+    opening_datetime = get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[0], PST_TIME_ZONE)
+    closing_datetime = get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[1], PST_TIME_ZONE)
+    slot_boundaries = generate_intervals_end_time_inclusive(opening_datetime, closing_datetime, slot_minutes)
+    slot_count = len(slot_boundaries) - 1
+    opening_minute = get_epoch_minutes(opening_datetime)
+
+    free = ~get_reserved_slots(reservations.court_ids, len(reservations.courts), reservations.starts, reservations.ends,
+                               opening_minute, slot_count, slot_minutes)
+
+    row_by_court = {court: row for row, court in enumerate(reservations.courts)}
+    courts_by_location = defaultdict(list)
+    for location, court in reservations.courts:
+        courts_by_location[location].append(court)
+    for courts in courts_by_location.values():
+        courts.sort(key=get_court_number)
+    free_by_location = {location: free[[row_by_court[(location, court)] for court in courts]]
+                        for location, courts in courts_by_location.items()}
+    return CourtOccupancy(slot_boundaries, dict(courts_by_location), free_by_location)
+
+
+def get_reserved_slots(rows: np.ndarray, row_count: int, starts: np.ndarray, ends: np.ndarray, opening_minutes,
+                       slot_count: int, slot_minutes: int) -> np.ndarray:
+    """
+    Returns a bool (row_count x slot_count) array, True where a slot of a row overlaps one of the reservations given as
+    parallel rows, starts and ends. `opening_minutes` is the opening of the day in minutes since the epoch, either one
+    for all the reservations or one per reservation.
+    """
+    # A slot is reserved when it overlaps a reservation, i.e. every slot from the one containing the start up to the
+    # one containing the last reserved minute. Mark +1/-1 at those bounds and a running sum counts the overlaps.
+    first_slots = np.clip((starts - opening_minutes) // slot_minutes, 0, slot_count)
+    end_slots = np.clip(-((opening_minutes - ends) // slot_minutes), 0, slot_count)
+    overlapping = first_slots < end_slots
+    marks = np.zeros((row_count, slot_count + 1), dtype=np.int32)
+    np.add.at(marks, (rows[overlapping], first_slots[overlapping]), 1)
+    np.add.at(marks, (rows[overlapping], end_slots[overlapping]), -1)
+    return np.cumsum(marks[:, :-1], axis=1) > 0
+
+
+@timed()
+def get_available_court_times_from_occupancy(occupancy: CourtOccupancy) -> dict:
+    slot_boundaries = occupancy.slot_boundaries
+    available_court_times_by_location = defaultdict(lambda: defaultdict(list))
+    for location, courts in occupancy.courts_by_location.items():
+        for court_number, free_slots in zip(courts, occupancy.free_by_location[location]):
+            available_court_times_by_location[location][court_number] = [
+                (slot_boundaries[slot], slot_boundaries[slot + 1]) for slot in np.flatnonzero(free_slots)]
+    return available_court_times_by_location
+
+
+def get_court_occupancy_for_date(court_date: datetime, court_times: list, slot_minutes: int = 30) -> CourtOccupancy:
+    logger.info(f"Computing court occupancy on {court_date}.")
+    return get_court_occupancy(court_date, parse_reservations(court_times), slot_minutes)
+
+
+def get_court_availability_for_date(court_date: datetime, court_times: list, slot_minutes: int = 30) -> CourtAvailability:
+    return CourtAvailability.from_occupancy(get_court_occupancy_for_date(court_date, court_times, slot_minutes))
+
+
+def iterate_set_bits(mask: int):
+    while mask:
+        lowest_bit = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
+
+
+def iterate_set_bit_runs(mask: int):
+    """Yields the [start, end) bit positions of every run of consecutive set bits, e.g. of free slots."""
+    position = 0
+    while mask:
+        lowest_bit = mask & -mask
+        run_start = position + lowest_bit.bit_length() - 1
+        mask >>= run_start - position
+        run_length = ((mask + 1) & ~mask).bit_length() - 1
+        yield run_start, run_start + run_length
+        mask >>= run_length
+        position = run_start + run_length
+
+
+def is_shown_on_court_reserve(event_online_sign_up_off, can_sign_up_to_event, registration_open):
+    """Works on the fields of a single scheduler entry as well as on whole NumPy columns of them."""
+    # Noticed there are these entries usually for Bellevue 10 and 11 that block 10 hours but don't actually
+    # show up on CourtReserve. These are the fields that seem to differentiate them from other entries (when all
+    # three fields are 'False').
+    # Revisit this if we notice that this is causing reserved slots to get dropped.
+    return event_online_sign_up_off | can_sign_up_to_event | registration_open
+
+
+@functools.lru_cache(maxsize=None)
+def parse_court_label(court_label: str):
+    # There are only a few dozen distinct labels, so each is only ever split once
+    space_delimited_court_label = court_label.split(' ')
+    if len(space_delimited_court_label) == 3 and "COACHING" not in court_label.upper():  # e.g. "Mukilteo Pickleball 12"
+        court_location = f"{space_delimited_court_label[0]} {space_delimited_court_label[1]}"
+        court_number = space_delimited_court_label[2]
+    else:
+        court_location = space_delimited_court_label[0]
+        court_number = space_delimited_court_label[1]
+    return court_location, f"Court {court_number}"
+
+
+def parse_epoch_minutes(utc_timestamps: list) -> np.ndarray:
+    # CourtReserve timestamps are UTC and end with 'Z', e.g. '2024-05-01T14:00:00Z'.
+    # NumPy parses the whole column in one go.
+    return np.array([utc_timestamp[:-1] for utc_timestamp in utc_timestamps], dtype='datetime64').astype('datetime64[m]').astype(np.int64)
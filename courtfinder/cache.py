@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+import traceback
+from collections import OrderedDict
+
+from courtfinder.constants import COURT_TIMES_CACHE_MAX_DATES, COURT_TIMES_CACHE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class CourtTimesCache:
+    """
+    Process-wide cache of CourtReserve scheduler responses shared by all sessions and reruns.
+
+    Entries expire after `ttl_seconds` and only the `max_entries` most recently used keys are kept.
+    Concurrent misses for the same key are coalesced so that only one caller hits upstream while the others wait
+    for its result. If reloading an expired entry fails, its last value is served until upstream recovers, callers
+    can tell it apart with `get_age_seconds`.
+    """
+
+    def __init__(self, ttl_seconds: float = COURT_TIMES_CACHE_TTL_SECONDS, max_entries: int = COURT_TIMES_CACHE_MAX_DATES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stale_served = 0  # Expired values served because reloading them failed
+        self._entries = OrderedDict()  # key -> (fetched_at, value), least recently used first
+        self._in_flight = {}  # key -> threading.Event set once the leading caller is done loading
+        self._listeners = []  # Called with (key, value) every time a value is loaded from upstream
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def get(self, key, loader):
+        return self._get_or_load(key, loader, refresh=False)
+
+    def refresh(self, key, loader):
+        # Reloads the key even if it hasn't expired yet, still coalesced with any load already in flight.
+        return self._get_or_load(key, loader, refresh=True)
+
+    def _get_or_load(self, key, loader, refresh: bool):
+        serve_stale = not refresh  # Refreshes are for keeping entries warm, their callers want to know about failures
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and not refresh:
+                    fetched_at, value = entry
+                    if time.monotonic() - fetched_at < self.ttl_seconds:
+                        self.hits += 1
+                        self._entries.move_to_end(key)
+                        return value
+                in_flight = self._in_flight.get(key)
+                if in_flight is None:
+                    if not refresh:
+                        if entry is not None:
+                            self.stale += 1
+                        else:
+                            self.misses += 1
+                    in_flight = self._in_flight[key] = threading.Event()
+                    in_flight.error = None
+                    break
+            # Another caller is already loading this key, wait for it and re-check.
+            # If it failed, its stale value is served if there is one, otherwise its error is raised without calling
+            # upstream again.
+            in_flight.wait()
+            if in_flight.error is not None:
+                with self._lock:
+                    entry = self._entries.get(key)
+                    if not serve_stale or entry is None:
+                        raise in_flight.error
+                    self.stale_served += 1
+                    return entry[1]
+            refresh = False
+
+        try:
+            value = loader()
+            self.put(key, value)
+        except Exception as e:
+            in_flight.error = e
+            with self._lock:
+                entry = self._entries.get(key)
+                if not serve_stale or entry is None:
+                    raise
+                self.stale_served += 1
+            logger.warning(f"Serving court times cached {time.monotonic() - entry[0]:.0f}s ago for {key}, "
+                           f"reloading failed - {type(e).__name__}: {str(e)}")
+            return entry[1]
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.set()
+
+        for listener in self._listeners:
+            try:
+                listener(key, value)
+            except Exception as e:
+                logger.error(f"Court times cache listener failed for {key} - {type(e).__name__}: {str(e)}")
+                logger.error(traceback.format_exc())
+        return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_age_seconds(self, key):
+        """Seconds since the cached value of `key` was loaded, over `ttl_seconds` if it is being served stale."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return None if entry is None else time.monotonic() - entry[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "stale": self.stale, "stale_served": self.stale_served,
+                    "entries": len(self._entries)}
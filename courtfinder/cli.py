@@ -0,0 +1,105 @@
+"""
+Headless availability queries, e.g. courts free at Bellevue for 2h starting 7 PM on the next 7 days:
+
+    python -m courtfinder --locations Bellevue --start 7PM --duration 2 --days 7
+
+or the best start times for 1.5h between 5 PM and 10 PM on the next 7 days, leaving the fewest unusable gaps:
+
+    python -m courtfinder --locations Bellevue --start 5PM --end 10PM --search 1.5 --rank fragmentation --days 7
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import date, datetime, time, timedelta
+
+from courtfinder import timeutils
+from courtfinder.constants import (BBCLocation, CLUB_OPENING_HOURS, PST_TIME_ZONE, RANK_BY_EARLIEST_START,
+                                   RANK_BY_LEAST_FRAGMENTATION)
+
+
+def parse_time(value: str) -> time:
+    try:
+        return timeutils.parse_time(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='courtfinder', description='Find courts free for a whole time range at BBC and print them as JSON.')
+    parser.add_argument('--date', type=date.fromisoformat, help='First date to look at (YYYY-MM-DD). Defaults to today.')
+    parser.add_argument('--days', type=int, default=1, help='Number of consecutive days to look at.')
+    parser.add_argument('--locations', nargs='+', choices=BBCLocation.get_all_locations(), default=BBCLocation.get_default_locations(),
+                        metavar='LOCATION', help=f"Any of {', '.join(BBCLocation.get_all_locations())}.")
+    parser.add_argument('--start', type=parse_time, default=time(CLUB_OPENING_HOURS[0]), help='Start time, e.g. 19:00 or 7PM.')
+    end_group = parser.add_mutually_exclusive_group()
+    end_group.add_argument('--end', type=parse_time, help='End time, e.g. 21:00 or 9PM. Defaults to closing.')
+    end_group.add_argument('--duration', type=float, help='Duration in hours, instead of an end time.')
+    parser.add_argument('--search', type=float, metavar='HOURS',
+                        help='Instead of courts free for the whole range, list every court and start time within the range free for that many hours.')
+    parser.add_argument('--rank', choices=[RANK_BY_EARLIEST_START, RANK_BY_LEAST_FRAGMENTATION], default=RANK_BY_EARLIEST_START,
+                        help=f"How --search results are ordered, '{RANK_BY_LEAST_FRAGMENTATION}' first lists the ones leaving the least free time unusable.")
+    parser.add_argument('--limit', type=int, help='Maximum number of --search results.')
+    parser.add_argument('--history-dir', help='Answer from a CourtTimesHistory directory instead of fetching from CourtReserve.')
+    parser.add_argument('--verbose', action='store_true', help='Log progress to stderr.')
+    return parser
+
+
+def main(argv: list = None) -> int:
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    start_time = args.start
+    if args.duration is not None:
+        end_time = (datetime.combine(date.min, start_time) + timedelta(hours=args.duration)).time()
+    else:
+        end_time = args.end or time(CLUB_OPENING_HOURS[1])
+    try:
+        timeutils.validate_time_range(start_time, end_time)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.days < 1:
+        parser.error("--days has to be at least 1.")
+    if args.search is not None and args.search <= 0:
+        parser.error("--search has to be a positive number of hours.")
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+
+    # Heavy imports are deferred until we know there's actual work to do
+    from courtfinder.availability import CourtAvailability, get_court_occupancy
+    from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime, get_formatted_time
+
+    start_date = get_datetime_by_hour(args.date or get_default_datetime(), 0, PST_TIME_ZONE)
+    errors_by_date = {}
+    if args.history_dir:
+        from courtfinder.history import CourtTimesHistory
+        history = CourtTimesHistory(args.history_dir)
+        court_dates = [get_datetime_by_hour(start_date + timedelta(days=day), 0, PST_TIME_ZONE) for day in range(args.days)]
+        occupancy_by_date = {court_date.date(): get_court_occupancy(court_date, history.get_reservations(court_date.date()))
+                             for court_date in court_dates}
+    else:
+        from courtfinder.fetch import get_court_occupancy_for_range
+        occupancy_by_date, errors_by_date = get_court_occupancy_for_range(start_date, args.days)
+
+    if args.search is not None:
+        from courtfinder.search import SlotSearchIndex
+        matches = SlotSearchIndex(occupancy_by_date).search(round(args.search * 60), start_time, end_time, locations=args.locations,
+                                                            rank_by=args.rank, limit=args.limit)
+        result = {"start": get_formatted_time(start_time), "end": get_formatted_time(end_time), "matches": [
+            {"date": str(match.date), "location": match.location, "court": match.court, "start": get_formatted_time(match.start),
+             "end": get_formatted_time(match.end), "free_minutes": match.free_minutes} for match in matches]}
+    else:
+        free_courts_by_date = {}
+        for court_date, occupancy in occupancy_by_date.items():
+            free_courts_by_location = CourtAvailability.from_occupancy(occupancy).get_courts_free_between(start_time, end_time)
+            free_courts_by_date[str(court_date)] = {location: free_courts_by_location.get(location, []) for location in args.locations}
+        result = {"start": get_formatted_time(start_time), "end": get_formatted_time(end_time), "free_courts": free_courts_by_date}
+
+    if errors_by_date:
+        # The dates that could be fetched are still answered
+        result["errors"] = {str(court_date): f"CourtReserve answered {e.response.status_code}" if e.response is not None
+                            else f"{type(e).__name__}: {e}" for court_date, e in errors_by_date.items()}
+
+    json.dump(result, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+    return 1 if errors_by_date else 0
@@ -0,0 +1,82 @@
+import os
+from enum import Enum
+
+PST_TIME_ZONE = 'America/Los_Angeles'
+BELLEVUE_BADMINTON_CLUB_ORG_ID = 7031
+CLUB_OPENING_HOURS = (6, 22)  # open, close hour
+# Overridable so that the app can be pointed at a local stub server serving recorded payloads.
+COURT_BOOKINGS_API_URL = os.environ.get('COURT_BOOKINGS_API_URL',
+                                        'https://memberschedulers.courtreserve.com/SchedulerApi/ReadExpandedApi')
+COURT_RESERVATIONS_LANDING_PAGE_URL = 'https://app.courtreserve.com/Online/Reservations/Bookings'
+COURT_TIMES_CACHE_TTL_SECONDS = 60
+COURT_TIMES_CACHE_MAX_DATES = 32  # Date picker allows today + 30 days ahead
+COURT_TIMES_CONNECT_TIMEOUT_SECONDS = float(os.environ.get('COURT_TIMES_CONNECT_TIMEOUT_SECONDS', 3.05))
+COURT_TIMES_REQUEST_TIMEOUT_SECONDS = float(os.environ.get('COURT_TIMES_REQUEST_TIMEOUT_SECONDS', 10))  # Read timeout
+COURT_TIMES_MAX_RETRIES = int(os.environ.get('COURT_TIMES_MAX_RETRIES', 3))
+COURT_TIMES_RETRY_BACKOFF_SECONDS = float(os.environ.get('COURT_TIMES_RETRY_BACKOFF_SECONDS', 0.5))  # Doubles on every retry
+# Random extra delay added to every backoff, so that requests failing together don't retry together
+COURT_TIMES_RETRY_JITTER_SECONDS = float(os.environ.get('COURT_TIMES_RETRY_JITTER_SECONDS', 0.25))
+COURT_TIMES_MAX_CONCURRENT_FETCHES = 8
+# Requests to CourtReserve shared by all sessions, halved whenever it answers 429 or 503 and recovering on successes.
+# Requests that would have to wait over the max wait fail instead, serving the cached court times if there are any.
+COURT_TIMES_RATE_LIMIT_PER_SECOND = float(os.environ.get('COURT_TIMES_RATE_LIMIT_PER_SECOND', 10))
+COURT_TIMES_RATE_LIMIT_BURST = int(os.environ.get('COURT_TIMES_RATE_LIMIT_BURST', 2 * COURT_TIMES_MAX_CONCURRENT_FETCHES))
+COURT_TIMES_RATE_LIMIT_MIN_PER_SECOND = 0.5
+COURT_TIMES_RATE_LIMIT_MAX_WAIT_SECONDS = 2
+# After that many failed requests in a row, requests fail fast for the reset time before a single one is tried again.
+# The last fetched court times are served, flagged as stale, in the meantime.
+COURT_TIMES_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('COURT_TIMES_CIRCUIT_FAILURE_THRESHOLD', 5))
+COURT_TIMES_CIRCUIT_RESET_SECONDS = float(os.environ.get('COURT_TIMES_CIRCUIT_RESET_SECONDS', 30))
+PREFETCH_DAYS = 7  # Rolling window starting from the default date
+PREFETCH_INTERVAL_SECONDS = COURT_TIMES_CACHE_TTL_SECONDS / 2  # Refresh well before cached entries expire
+PREFETCH_INTERVAL_JITTER_SECONDS = 5
+# Directory where every fetched scheduler payload gets appended for historical analysis. Disabled when unset.
+COURT_TIMES_HISTORY_DIR = os.environ.get('COURT_TIMES_HISTORY_DIR')
+# Waitlist watches on today are polled every minute (as often as the cache refetches), twice as rarely for every day
+# further out, and at most every 16 minutes.
+WATCH_POLL_MIN_INTERVAL_SECONDS = COURT_TIMES_CACHE_TTL_SECONDS
+WATCH_POLL_MAX_INTERVAL_SECONDS = 16 * 60
+# Where watch notifications go, a webhook receiving them as JSON POSTs or a file getting them as JSON lines.
+# Watches are disabled when neither is set.
+WATCH_NOTIFY_WEBHOOK_URL = os.environ.get('WATCH_NOTIFY_WEBHOOK_URL')
+WATCH_NOTIFY_FILE = os.environ.get('WATCH_NOTIFY_FILE')
+# Utilization analytics are kept up to date from the court times history, in this file of the history directory.
+UTILIZATION_AGGREGATES_FILE = 'utilization.npz'
+UTILIZATION_BACKFILL_MAX_WEEKS = 12  # Past weeks the utilization page can fetch from CourtReserve at once
+# How slot searches order their matches, by earliest start or by the least free time they leave unusable around them
+RANK_BY_EARLIEST_START = 'earliest'
+RANK_BY_LEAST_FRAGMENTATION = 'fragmentation'
+API_RESPONSE_CACHE_MAX_ENTRIES = 256  # Rendered (date, locations, time range) responses kept by the availability API
+API_COMPRESSION_MIN_BYTES = 1024  # Smaller responses aren't worth gzipping
+# Per-stage latency histograms and counters, shown on the ?debug=true page. 'false' turns off all timing.
+METRICS_ENABLED = os.environ.get('COURTFINDER_METRICS', 'true').lower() != 'false'
+# Also serves the metrics in the Prometheus text format on http://localhost:<port>/metrics when set.
+METRICS_PORT = os.environ.get('COURTFINDER_METRICS_PORT')
+
+
+class BBCLocation(Enum):
+    BELLEVUE = "Bellevue"
+    MUKILTEO = "Mukilteo"
+    RENTON = "Renton"
+    MUKILTEO_PICKLEBALL = "Mukilteo Pickleball"
+
+    @classmethod
+    def get_all_locations(cls):
+        return [location.value for location in BBCLocation]
+
+    @classmethod
+    def get_default_locations(cls):
+        return [location.value for location in BBCLocation if location != BBCLocation.MUKILTEO_PICKLEBALL]
+
+
+EARLY_ACCESS_PREFIX = "Early Access: "
+
+LOCATION_NAME_TO_ID_MAPPING = {
+    BBCLocation.BELLEVUE.value: 1476,
+    BBCLocation.MUKILTEO.value: 1478,
+    BBCLocation.RENTON.value: 1479,
+    EARLY_ACCESS_PREFIX + BBCLocation.BELLEVUE.value: 1503,
+    EARLY_ACCESS_PREFIX + BBCLocation.MUKILTEO.value: 1504,
+    EARLY_ACCESS_PREFIX + BBCLocation.RENTON.value: 1505,
+    BBCLocation.MUKILTEO_PICKLEBALL.value: 15460
+}
@@ -0,0 +1,258 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from courtfinder.availability import compute_available_court_times_by_location, get_court_occupancy_for_date
+from courtfinder.cache import CourtTimesCache
+from courtfinder.constants import (BELLEVUE_BADMINTON_CLUB_ORG_ID, COURT_BOOKINGS_API_URL, COURT_TIMES_CONNECT_TIMEOUT_SECONDS,
+                                   COURT_TIMES_MAX_CONCURRENT_FETCHES, COURT_TIMES_MAX_RETRIES,
+                                   COURT_TIMES_REQUEST_TIMEOUT_SECONDS, COURT_TIMES_RETRY_BACKOFF_SECONDS,
+                                   COURT_TIMES_RETRY_JITTER_SECONDS, PST_TIME_ZONE)
+from courtfinder.metrics import get_metrics_registry, span, timed
+from courtfinder.resilience import CIRCUIT_CLOSED, CircuitBreaker, RateLimitedError, TokenBucket
+from courtfinder.timeutils import get_datetime_by_hour
+
+logger = logging.getLogger(__name__)
+
+_court_times_cache = None
+_court_times_session = None
+_rate_limiter = None
+_circuit_breaker = None
+_resources_lock = threading.Lock()
+
+THROTTLED_STATUSES = (429, 503)
+
+
+def create_court_times_session() -> requests.Session:
+    # Keep-alive connection pool sized for the concurrent range fetches, retrying transient failures with backoff.
+    # Throttled requests aren't retried here, since retries don't go through the rate limiter. Their first response
+    # slows the rate limiter down instead and the cache keeps serving the last court times. urllib3 would otherwise
+    # still retry a 429 or 503 carrying Retry-After, sleeping for as long as upstream asks on a Streamlit thread.
+    # The last response is returned rather than raised once retries run out, so that its status can be looked at.
+    retry = Retry(total=COURT_TIMES_MAX_RETRIES,
+                  backoff_factor=COURT_TIMES_RETRY_BACKOFF_SECONDS,
+                  backoff_jitter=COURT_TIMES_RETRY_JITTER_SECONDS,
+                  status_forcelist=(500, 502, 504),
+                  respect_retry_after_header=False,
+                  allowed_methods=("GET",),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=COURT_TIMES_MAX_CONCURRENT_FETCHES, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+@timed()
+def fetch_court_times_data(court_date: datetime, session: requests.Session = None):
+    headers = {
+        'accept': '*/*',
+        'accept-language': 'en-US,en;q=0.9',
+        'origin': 'https://app.courtreserve.com',
+        'priority': 'u=1, i',
+        'referer': 'https://app.courtreserve.com/',
+        'sec-ch-ua': '"Chromium";v="124", "Google Chrome";v="124", "Not-A.Brand";v="99"',
+        'sec-ch-ua-mobile': '?0',
+        'sec-ch-ua-platform': '"macOS"',
+        'sec-fetch-dest': 'empty',
+        'sec-fetch-mode': 'cors',
+        'sec-fetch-site': 'same-site',
+        'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36'
+    }
+    utc_datetime = court_date.astimezone(timezone.utc)
+    params = {
+        'id': str(BELLEVUE_BADMINTON_CLUB_ORG_ID),
+        'uiCulture': 'en-US',
+        'sort': '',
+        'group': '',
+        'filter': '',
+        'jsonData': json.dumps({
+            'startDate': utc_datetime.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'orgId': str(BELLEVUE_BADMINTON_CLUB_ORG_ID),
+            'TimeZone': PST_TIME_ZONE,
+            'Date': court_date.strftime('%a, %d %b %Y %H:%M:%S GMT'),
+            'KendoDate': {'Year': court_date.year, 'Month': court_date.month, 'Day': court_date.day},
+            'UiCulture': 'en-US',
+            'CostTypeId': '88166',
+            'CustomSchedulerId': '',  # Retrieves for all locations
+            'ReservationMinInterval': '60',
+            'SelectedCourtIds': '',  # Retrieves for all court numbers
+            'SelectedInstructorIds': '',
+            'MemberIds': '',
+            'MemberFamilyId': '',
+            'EmbedCodeId': '',
+            'HideEmbedCodeReservationDetails': 'True'
+        })
+    }
+    circuit_breaker = get_circuit_breaker()
+    rate_limiter = get_rate_limiter()
+    circuit_breaker.before_call()
+    try:
+        rate_limiter.acquire()
+    except RateLimitedError:
+        circuit_breaker.cancel_call()
+        raise
+    request_start = time.perf_counter()
+    status = 'error'
+    try:
+        response = (session or requests).get(COURT_BOOKINGS_API_URL, params=params, headers=headers,
+                                             timeout=(COURT_TIMES_CONNECT_TIMEOUT_SECONDS, COURT_TIMES_REQUEST_TIMEOUT_SECONDS))
+        status = str(response.status_code)
+        if response.status_code in THROTTLED_STATUSES:
+            rate_limiter.on_throttled()
+        response.raise_for_status()  # Raise an exception for non-2xx status codes
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Error fetching court times data: {e}")
+        if is_upstream_failure(e):
+            circuit_breaker.record_failure()
+        else:
+            circuit_breaker.record_success()
+        raise e
+    else:
+        circuit_breaker.record_success()
+        rate_limiter.on_success()
+    finally:
+        # Includes the retries
+        record_upstream_request(time.perf_counter() - request_start, status)
+    with span('decode_court_times_json'):
+        return response.json()['Data']
+
+
+def is_upstream_failure(error: requests.exceptions.RequestException) -> bool:
+    # Client errors mean upstream is up and answering, just not to this request. Throttling is left to the rate limiter.
+    return error.response is None or error.response.status_code >= 500
+
+
+def record_upstream_request(duration_seconds: float, status: str):
+    registry = get_metrics_registry()
+    if registry.enabled:
+        registry.observe('courtfinder_upstream_request_duration_seconds', duration_seconds, status=status)
+        registry.increment('courtfinder_upstream_requests_total', status=status)
+
+
+def get_court_times_cache_key(court_date: datetime):
+    return BELLEVUE_BADMINTON_CLUB_ORG_ID, court_date.date()
+
+
+def get_court_times_cache() -> CourtTimesCache:
+    global _court_times_cache
+    with _resources_lock:
+        if _court_times_cache is None:
+            _court_times_cache = CourtTimesCache()
+            get_metrics_registry().add_collector(collect_court_times_cache_metrics)
+        return _court_times_cache
+
+
+def collect_court_times_cache_metrics():
+    stats = get_court_times_cache().stats()
+    return [('courtfinder_court_times_cache_hits_total', 'counter', stats['hits']),
+            ('courtfinder_court_times_cache_misses_total', 'counter', stats['misses']),
+            ('courtfinder_court_times_cache_stale_total', 'counter', stats['stale']),
+            ('courtfinder_court_times_cache_stale_served_total', 'counter', stats['stale_served']),
+            ('courtfinder_court_times_cache_entries', 'gauge', stats['entries'])]
+
+
+def get_court_times_session() -> requests.Session:
+    global _court_times_session
+    with _resources_lock:
+        if _court_times_session is None:
+            _court_times_session = create_court_times_session()
+        return _court_times_session
+
+
+def get_rate_limiter() -> TokenBucket:
+    global _rate_limiter
+    with _resources_lock:
+        if _rate_limiter is None:
+            _rate_limiter = TokenBucket()
+            get_metrics_registry().add_collector(collect_rate_limiter_metrics)
+        return _rate_limiter
+
+
+def collect_rate_limiter_metrics():
+    status = get_rate_limiter().status()
+    return [('courtfinder_upstream_rate_limit_per_second', 'gauge', status['rate_per_second']),
+            ('courtfinder_upstream_rate_limited_total', 'counter', status['rejected'])]
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    global _circuit_breaker
+    with _resources_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker()
+            get_metrics_registry().add_collector(collect_circuit_breaker_metrics)
+        return _circuit_breaker
+
+
+def collect_circuit_breaker_metrics():
+    status = get_circuit_breaker().status()
+    return [('courtfinder_upstream_circuit_open', 'gauge', int(status['state'] != CIRCUIT_CLOSED)),
+            ('courtfinder_upstream_circuit_rejected_total', 'counter', status['rejected'])]
+
+
+def get_stale_court_times_age_seconds(court_date: datetime):
+    """
+    Age of the court times of `court_date` if they are being served past their expiry because upstream is failing,
+    None if they are fresh.
+    """
+    cache = get_court_times_cache()
+    age_seconds = cache.get_age_seconds(get_court_times_cache_key(court_date))
+    return age_seconds if age_seconds is not None and age_seconds >= cache.ttl_seconds else None
+
+
+def fetch_court_times_data_cached(court_date: datetime):
+    session = get_court_times_session()
+    return get_court_times_cache().get(get_court_times_cache_key(court_date), lambda: fetch_court_times_data(court_date, session))
+
+
+def get_available_court_times_by_location(court_date: datetime, slot_minutes: int = 30) -> dict:
+    logger.info(f"Fetching reserved court times on {court_date}.")
+    return compute_available_court_times_by_location(court_date, fetch_court_times_data_cached(court_date), slot_minutes)
+
+
+def get_court_occupancy_for_range(start_date: datetime, days: int, slot_minutes: int = 30) -> tuple:
+    """
+    Fetches `days` consecutive days starting at `start_date` concurrently over the pooled session. Returns the court
+    occupancy of every date fetched, and the error of every date that couldn't be, as (date -> CourtOccupancy,
+    date -> exception).
+    """
+    logger.info(f"Fetching reserved court times for {days} days starting on {start_date}.")
+    court_dates = [get_datetime_by_hour(start_date + timedelta(days=day), 0, PST_TIME_ZONE) for day in range(days)]
+    court_times_by_date, errors_by_date = fetch_concurrently(fetch_court_times_data_cached, court_dates)
+    return ({court_date: get_court_occupancy_for_date(get_datetime_by_hour(court_date, 0, PST_TIME_ZONE), court_times, slot_minutes)
+             for court_date, court_times in court_times_by_date.items()}, errors_by_date)
+
+
+def fetch_court_times_for_dates(court_dates: list) -> tuple:
+    """
+    Fetches the given dates concurrently, bypassing the cache so that e.g. backfilling past dates doesn't evict the
+    dates sessions are looking at. Returns (date -> scheduler payload, date -> exception) like
+    get_court_occupancy_for_range().
+    """
+    logger.info(f"Fetching reserved court times for {len(court_dates)} dates.")
+    session = get_court_times_session()
+    court_dates = [get_datetime_by_hour(court_date, 0, PST_TIME_ZONE) for court_date in court_dates]
+    return fetch_concurrently(lambda court_date: fetch_court_times_data(court_date, session), court_dates)
+
+
+def fetch_concurrently(fetch, court_dates: list) -> tuple:
+    # A failed date, e.g. rate limited, doesn't take the dates fetched fine down with it
+    court_times_by_date = {}
+    errors_by_date = {}
+    with ThreadPoolExecutor(max_workers=COURT_TIMES_MAX_CONCURRENT_FETCHES) as executor:
+        futures = [executor.submit(fetch, court_date) for court_date in court_dates]
+        for court_date, future in zip(court_dates, futures):
+            try:
+                court_times_by_date[court_date.date()] = future.result()
+            except requests.exceptions.RequestException as e:
+                errors_by_date[court_date.date()] = e
+    if errors_by_date:
+        logger.warning(f"Unable to fetch {len(errors_by_date)} of {len(court_dates)} dates: {', '.join(map(str, errors_by_date))}.")
+    return court_times_by_date, errors_by_date
@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+from courtfinder.availability import Reservations, is_shown_on_court_reserve, parse_court_label, parse_epoch_minutes
+
+RESERVATION_RECORD_DTYPE = np.dtype([
+    ('fetched_at', '<i8'),  # Seconds since the epoch
+    ('court_date', '<i4'),  # date.toordinal()
+    ('location', '<u2'),  # Index into the history labels
+    ('court', '<u2'),  # Index into the history labels
+    ('start', '<i8'),  # Minutes since the epoch
+    ('end', '<i8'),  # Minutes since the epoch
+    ('event_online_sign_up_off', '?'),
+    ('can_sign_up_to_event', '?'),
+    ('registration_open', '?'),
+])
+PAYLOAD_RECORD_DTYPE = np.dtype([
+    ('court_date', '<i4'),  # date.toordinal()
+    ('fetched_at', '<i8'),  # Seconds since the epoch
+    ('offset', '<i8'),  # Index of the first reservation record of the payload
+    ('count', '<i8'),  # Number of reservation records, 0 when nothing was reserved
+])
+
+
+class CourtTimesHistory:
+    """
+    Append-only on-disk store of every fetched scheduler payload, normalized into fixed-size reservation records.
+
+    Records are appended to a single flat file that is read back as a memory-mapped NumPy structured array, so
+    scanning months of history doesn't copy or parse anything. Every payload also gets an entry in an index of
+    payloads pointing at its records, so that a payload without any reservation is recorded too. Location and court
+    names are interned in a JSON file next to them. Payloads identical to the last one stored for the same date are
+    skipped.
+    """
+
+    def __init__(self, directory: str):
+        self.records_path = os.path.join(directory, 'reservations.bin')
+        self.payloads_path = os.path.join(directory, 'payloads.bin')
+        self.labels_path = os.path.join(directory, 'labels.json')
+        os.makedirs(directory, exist_ok=True)
+        if not os.path.exists(self.payloads_path) and os.path.exists(self.records_path):
+            self._rebuild_payload_index()
+        self._labels = []
+        if os.path.exists(self.labels_path):
+            with open(self.labels_path) as f:
+                self._labels = json.load(f)
+        self._label_ids = {label: label_id for label_id, label in enumerate(self._labels)}
+        self._flushed_label_count = len(self._labels)
+        self._last_digest_by_date = {}
+        self._lock = threading.Lock()
+
+    def append(self, court_date: date, court_times: list, fetched_at: datetime = None):
+        fetched_at = int((fetched_at or datetime.now(timezone.utc)).timestamp())
+        with self._lock:
+            courts = [parse_court_label(item["CourtLabel"]) for item in court_times]
+            records = np.zeros(len(court_times), dtype=RESERVATION_RECORD_DTYPE)
+            records['court_date'] = court_date.toordinal()
+            records['location'] = [self._intern(court_location) for court_location, _ in courts]
+            records['court'] = [self._intern(court_number) for _, court_number in courts]
+            records['start'] = parse_epoch_minutes([item["Start"] for item in court_times])
+            records['end'] = parse_epoch_minutes([item["End"] for item in court_times])
+            records['event_online_sign_up_off'] = [item["EventOnlineSignUpOff"] for item in court_times]
+            records['can_sign_up_to_event'] = [item["CanSignUpToEvent"] for item in court_times]
+            records['registration_open'] = [item["RegistrationOpen"] for item in court_times]
+
+            digest = hashlib.sha1(records.tobytes()).digest()
+            if digest == self._last_digest_by_date.get(court_date):
+                return
+            records['fetched_at'] = fetched_at
+
+            # Labels go to disk first so that records never reference a label that doesn't exist yet
+            if len(self._labels) > self._flushed_label_count:
+                with open(self.labels_path + '.tmp', 'w') as f:
+                    json.dump(self._labels, f)
+                os.replace(self.labels_path + '.tmp', self.labels_path)
+                self._flushed_label_count = len(self._labels)
+            # Same for records before the payload entry pointing at them
+            with open(self.records_path, 'ab') as f:
+                offset = f.tell() // RESERVATION_RECORD_DTYPE.itemsize
+                f.write(records.tobytes())
+            payload = np.array([(court_date.toordinal(), fetched_at, offset, len(records))], dtype=PAYLOAD_RECORD_DTYPE)
+            with open(self.payloads_path, 'ab') as f:
+                f.write(payload.tobytes())
+            self._last_digest_by_date[court_date] = digest
+
+    def read(self) -> np.ndarray:
+        if not os.path.exists(self.records_path) or os.path.getsize(self.records_path) == 0:
+            return np.empty(0, dtype=RESERVATION_RECORD_DTYPE)
+        return np.memmap(self.records_path, dtype=RESERVATION_RECORD_DTYPE, mode='r')
+
+    def read_payloads(self) -> np.ndarray:
+        """Every stored payload in the order they were appended, pointing at their records in `read()`."""
+        if not os.path.exists(self.payloads_path) or os.path.getsize(self.payloads_path) == 0:
+            return np.empty(0, dtype=PAYLOAD_RECORD_DTYPE)
+        return np.memmap(self.payloads_path, dtype=PAYLOAD_RECORD_DTYPE, mode='r')
+
+    def get_reservations(self, court_date: date, as_of: datetime = None) -> Reservations:
+        """Returns the reservations of the last payload fetched for `court_date`, as of `as_of` if given."""
+        payloads = self.read_payloads()
+        payloads = payloads[payloads['court_date'] == court_date.toordinal()]
+        if as_of is not None:
+            payloads = payloads[payloads['fetched_at'] <= as_of.timestamp()]
+        records = np.empty(0, dtype=RESERVATION_RECORD_DTYPE)
+        if len(payloads):
+            # The last one appended if several were fetched in the same second
+            payload = payloads[np.flatnonzero(payloads['fetched_at'] == payloads['fetched_at'].max())[-1]]
+            records = self.read()[payload['offset']:payload['offset'] + payload['count']]
+        records = records[is_shown_record(records)]
+        courts, court_ids = get_record_courts(records, self.get_labels())
+        return Reservations(courts, court_ids, records['start'].astype(np.int64), records['end'].astype(np.int64))
+
+    def get_labels(self) -> list:
+        """Location and court names by label id, including the ones added by another instance appending to the directory."""
+        with self._lock:
+            # Labels are flushed before the records referencing them, so reloading them covers every record read so far
+            if os.path.exists(self.labels_path) and len(self._labels) == self._flushed_label_count:
+                with open(self.labels_path) as f:
+                    labels = json.load(f)
+                if len(labels) > len(self._labels):
+                    self._labels = labels
+                    self._label_ids = {label: label_id for label_id, label in enumerate(labels)}
+                    self._flushed_label_count = len(labels)
+            return list(self._labels)
+
+    def on_court_times_loaded(self, cache_key, court_times: list):
+        self.append(cache_key[1], court_times)
+
+    def _rebuild_payload_index(self):
+        # Directories written before the payload index existed, where every run of records fetched together for the
+        # same date is a payload. Payloads without any reservation weren't recorded back then.
+        records = self.read()
+        payload_starts = np.flatnonzero(np.diff(records['court_date'], prepend=-1) | np.diff(records['fetched_at'], prepend=-1))
+        payloads = np.zeros(len(payload_starts), dtype=PAYLOAD_RECORD_DTYPE)
+        payloads['court_date'] = records['court_date'][payload_starts]
+        payloads['fetched_at'] = records['fetched_at'][payload_starts]
+        payloads['offset'] = payload_starts
+        payloads['count'] = np.diff(payload_starts, append=len(records))
+        with open(self.payloads_path + '.tmp', 'wb') as f:
+            f.write(payloads.tobytes())
+        os.replace(self.payloads_path + '.tmp', self.payloads_path)
+
+    def _intern(self, label: str) -> int:
+        label_id = self._label_ids.get(label)
+        if label_id is None:
+            label_id = self._label_ids[label] = len(self._labels)
+            self._labels.append(label)
+        return label_id
+
+
+def is_shown_record(records: np.ndarray) -> np.ndarray:
+    """Which reservation records parse_reservations() would keep."""
+    return is_shown_on_court_reserve(records['event_online_sign_up_off'], records['can_sign_up_to_event'], records['registration_open'])
+
+
+def get_record_courts(records: np.ndarray, labels: list) -> tuple:
+    """
+    Numbers the distinct (location, court) pairs of reservation records in order of first appearance, like
+    parse_reservations() does. Returns the pairs, and the index into them of every record.
+    """
+    court_keys = records['location'].astype(np.int64) << 16 | records['court']
+    unique_court_keys, first_indices, court_ids = np.unique(court_keys, return_index=True, return_inverse=True)
+    appearance_order = np.argsort(first_indices)
+    court_id_by_unique_index = np.empty_like(appearance_order)
+    court_id_by_unique_index[appearance_order] = np.arange(len(appearance_order))
+    courts = [(labels[court_key >> 16], labels[court_key & 0xFFFF]) for court_key in unique_court_keys[appearance_order].tolist()]
+    return courts, court_id_by_unique_index[court_ids.reshape(-1)].astype(np.intp)
+
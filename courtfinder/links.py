@@ -0,0 +1,37 @@
+import logging
+import traceback
+from datetime import datetime, time
+
+from courtfinder.constants import (BELLEVUE_BADMINTON_CLUB_ORG_ID, COURT_RESERVATIONS_LANDING_PAGE_URL, EARLY_ACCESS_PREFIX,
+                                   LOCATION_NAME_TO_ID_MAPPING)
+
+logger = logging.getLogger(__name__)
+
+
+def get_court_link(location_name: str, court_start: datetime):
+    try:
+        return get_bbc_court_reservation_page(get_location_id_by_name_and_start_hour(location_name, court_start))
+    except Exception as e:
+        logger.error(f"Unable to get a link for {location_name} - {type(e).__name__}: {str(e)}")
+        logger.error(traceback.format_exc())  # Print the full traceback
+
+
+def get_location_id_by_name_and_start_hour(location_name: str, court_start: datetime):
+    try:
+        # Check if it's Early Access
+        if ((court_start.weekday() < 5 and court_start.time() < time(9, 0) or  # Weekdays before 9AM
+             court_start.weekday() >= 6 and court_start.time() < time(8, 0)) and  # Weekends before 8AM
+                "Pickleball" not in location_name):
+            location_lookup_name = EARLY_ACCESS_PREFIX + location_name
+        else:
+            location_lookup_name = location_name
+        location_id = LOCATION_NAME_TO_ID_MAPPING[location_lookup_name]
+        return location_id
+    except KeyError as e:
+        logger.error(
+            f"Unable to get location id for {location_name}. We only have mappings for {LOCATION_NAME_TO_ID_MAPPING.keys()}.")
+        raise e
+
+
+def get_bbc_court_reservation_page(location_id: int):
+    return f"{COURT_RESERVATIONS_LANDING_PAGE_URL}/{BELLEVUE_BADMINTON_CLUB_ORG_ID}?sId={location_id}"
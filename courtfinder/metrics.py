@@ -0,0 +1,186 @@
+"""
+In-process latency histograms and counters for the hot path, rendered in the Prometheus text format.
+
+Stages are timed with `span(name)` blocks or the `@timed()` decorator. With metrics turned off (see
+`METRICS_ENABLED`), `timed` leaves functions undecorated and `span` hands out a shared no-op context manager.
+"""
+import bisect
+import contextlib
+import functools
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from courtfinder.constants import METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SPAN_DURATION_METRIC = 'courtfinder_span_duration_seconds'
+SPAN_ERRORS_METRIC = 'courtfinder_span_errors_total'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_NO_OP_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS_SECONDS):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)  # Last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Histograms and counters keyed by metric name and labels, plus collectors for values kept elsewhere."""
+
+    def __init__(self, enabled: bool = METRICS_ENABLED):
+        self.enabled = enabled
+        self._histograms = {}  # (name, labels) -> Histogram
+        self._counters = {}  # (name, labels) -> value
+        self._collectors = []  # Called on render, each returning (name, type, value) tuples
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collect):
+        self._collectors.append(collect)
+
+    def span(self, name: str):
+        """Times the block into the span duration histogram, and counts it as an error if it raises."""
+        if not self.enabled:
+            return _NO_OP_SPAN
+        return _Span(self, name)
+
+    def timed(self, name: str = None):
+        """Decorator timing every call as a span named after the function by default."""
+        def decorator(func):
+            if not self.enabled:
+                return func
+            span_name = name or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Span(self, span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self) -> str:
+        with self._lock:
+            histograms = [(name, labels, list(histogram.bucket_counts), histogram.buckets, histogram.sum, histogram.count)
+                          for (name, labels), histogram in self._histograms.items()]
+            counters = list(self._counters.items())
+        lines = []
+        typed_names = set()
+
+        def add_type(name, metric_type):
+            if name not in typed_names:
+                typed_names.add(name)
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        for name, labels, bucket_counts, buckets, total, count in sorted(histograms):
+            add_type(name, 'histogram')
+            cumulative_count = 0
+            for bound, bucket_count in zip([*map(str, buckets), '+Inf'], bucket_counts):
+                cumulative_count += bucket_count
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative_count}")
+            lines.append(f"{name}_sum{format_labels(labels)} {total}")
+            lines.append(f"{name}_count{format_labels(labels)} {count}")
+        for (name, labels), value in sorted(counters):
+            add_type(name, 'counter')
+            lines.append(f"{name}{format_labels(labels)} {value}")
+        for collect in self._collectors:
+            try:
+                for name, metric_type, value in collect():
+                    add_type(name, metric_type)
+                    lines.append(f"{name} {value}")
+            except Exception as e:
+                logger.error(f"Error collecting metrics: {e}")
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.registry.observe(SPAN_DURATION_METRIC, time.perf_counter() - self.start, span=self.name)
+        if exc_type is not None:
+            self.registry.increment(SPAN_ERRORS_METRIC, span=self.name)
+        return False
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return _registry
+
+
+def span(name: str):
+    return _registry.span(name)
+
+
+def timed(name: str = None):
+    return _registry.timed(name)
+
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', registry: MetricsRegistry = _registry) -> ThreadingHTTPServer:
+    """Serves the registry at http://<host>:<port>/metrics from a daemon thread, for Prometheus to scrape."""
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{port}/metrics.")
+    return server
@@ -0,0 +1,83 @@
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import requests
+
+from courtfinder.cache import CourtTimesCache
+from courtfinder.constants import (COURT_TIMES_MAX_CONCURRENT_FETCHES, PREFETCH_DAYS, PREFETCH_INTERVAL_JITTER_SECONDS,
+                                   PREFETCH_INTERVAL_SECONDS, PST_TIME_ZONE)
+from courtfinder.fetch import fetch_court_times_data, get_court_times_cache_key
+from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler:
+    """
+    Background thread in the Streamlit server process that keeps the shared cache warm for the next `days` days,
+    so that UI reads don't have to wait on a cold CourtReserve round trip.
+    """
+
+    def __init__(self, cache: CourtTimesCache, session: requests.Session, days: int = PREFETCH_DAYS,
+                 interval_seconds: float = PREFETCH_INTERVAL_SECONDS, jitter_seconds: float = PREFETCH_INTERVAL_JITTER_SECONDS):
+        self.cache = cache
+        self.session = session
+        self.days = days
+        self.interval_seconds = interval_seconds
+        self.jitter_seconds = jitter_seconds
+        self._status_by_date = {}  # date -> {"last_refresh": datetime, "error_count": int, "last_error": str}
+        self._status_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # Only one refresh cycle runs at a time
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="court-times-prefetch", daemon=True)
+
+    def start(self):
+        logger.info(f"Starting prefetch of the next {self.days} days every ~{self.interval_seconds}s.")
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def refresh(self) -> bool:
+        if not self._refresh_lock.acquire(blocking=False):
+            return False
+        try:
+            default_datetime = get_default_datetime()
+            court_dates = [get_datetime_by_hour(default_datetime + timedelta(days=day), 0, PST_TIME_ZONE)
+                           for day in range(self.days)]
+            with ThreadPoolExecutor(max_workers=COURT_TIMES_MAX_CONCURRENT_FETCHES) as executor:
+                executor.map(self._refresh_date, court_dates)
+            with self._status_lock:
+                window = {court_date.date() for court_date in court_dates}
+                self._status_by_date = {date: status for date, status in self._status_by_date.items() if date in window}
+            return True
+        finally:
+            self._refresh_lock.release()
+
+    def status(self) -> dict:
+        with self._status_lock:
+            return {str(date): dict(status) for date, status in sorted(self._status_by_date.items())}
+
+    def _refresh_date(self, court_date: datetime):
+        try:
+            self.cache.refresh(get_court_times_cache_key(court_date), lambda: fetch_court_times_data(court_date, self.session))
+            with self._status_lock:
+                status = self._status_by_date.setdefault(court_date.date(), {"error_count": 0})
+                status["last_refresh"] = datetime.now(ZoneInfo(PST_TIME_ZONE)).isoformat()
+        except Exception as e:
+            logger.error(f"Unable to prefetch court times on {court_date.date()} - {type(e).__name__}: {str(e)}")
+            with self._status_lock:
+                status = self._status_by_date.setdefault(court_date.date(), {"error_count": 0})
+                status["error_count"] += 1
+                status["last_error"] = f"{type(e).__name__}: {str(e)}"
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            self.refresh()
+            self._stop_event.wait(self.interval_seconds + random.uniform(-self.jitter_seconds, self.jitter_seconds))
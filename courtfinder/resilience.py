@@ -0,0 +1,145 @@
+"""
+Client-side protection of CourtReserve: a process-wide token bucket bounding the request rate, and a circuit breaker
+failing fast while upstream is down instead of tying up Streamlit threads on requests that will time out anyway.
+"""
+import logging
+import threading
+import time
+
+import requests
+
+from courtfinder.constants import (COURT_TIMES_CIRCUIT_FAILURE_THRESHOLD, COURT_TIMES_CIRCUIT_RESET_SECONDS,
+                                   COURT_TIMES_RATE_LIMIT_BURST, COURT_TIMES_RATE_LIMIT_MAX_WAIT_SECONDS,
+                                   COURT_TIMES_RATE_LIMIT_MIN_PER_SECOND, COURT_TIMES_RATE_LIMIT_PER_SECOND)
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = 'closed'
+CIRCUIT_OPEN = 'open'
+CIRCUIT_HALF_OPEN = 'half_open'
+
+
+# Subclassing RequestException so that callers already handling failed requests handle these as well
+class UpstreamUnavailableError(requests.exceptions.RequestException):
+    pass
+
+
+class RateLimitedError(UpstreamUnavailableError):
+    pass
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    pass
+
+
+class TokenBucket:
+    """
+    Token bucket allowing `rate_per_second` requests on average, in bursts of up to `burst`.
+
+    The rate adapts to upstream: it halves every time upstream pushes back (429 or 503), down to `min_rate_per_second`,
+    and climbs back by a tenth of the configured rate with every success.
+    """
+
+    def __init__(self, rate_per_second: float = COURT_TIMES_RATE_LIMIT_PER_SECOND, burst: int = COURT_TIMES_RATE_LIMIT_BURST,
+                 min_rate_per_second: float = COURT_TIMES_RATE_LIMIT_MIN_PER_SECOND,
+                 max_wait_seconds: float = COURT_TIMES_RATE_LIMIT_MAX_WAIT_SECONDS):
+        self.max_rate_per_second = rate_per_second
+        self.min_rate_per_second = min_rate_per_second
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_wait_seconds = max_wait_seconds
+        self.rejected = 0
+        self._tokens = float(burst)
+        self._refilled_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, waiting for it if needed, or raises RateLimitedError if that would take over `max_wait_seconds`."""
+        with self._lock:
+            self._refill()
+            wait_seconds = max(1 - self._tokens, 0) / self.rate_per_second
+            if wait_seconds > self.max_wait_seconds:
+                self.rejected += 1
+                raise RateLimitedError(f"Over the CourtReserve request rate of {self.rate_per_second:.2f}/s.")
+            # Reserving the token now keeps waiting callers in order
+            self._tokens -= 1
+        if wait_seconds > 0:
+            time.sleep(wait_seconds)
+
+    def on_success(self):
+        with self._lock:
+            self.rate_per_second = min(self.rate_per_second + self.max_rate_per_second / 10, self.max_rate_per_second)
+
+    def on_throttled(self):
+        with self._lock:
+            self._refill()
+            self.rate_per_second = max(self.rate_per_second / 2, self.min_rate_per_second)
+        logger.warning(f"CourtReserve is throttling, slowing down to {self.rate_per_second:.2f} requests/s.")
+
+    def status(self) -> dict:
+        with self._lock:
+            self._refill()
+            return {"rate_per_second": round(self.rate_per_second, 3), "tokens": round(self._tokens, 3), "rejected": self.rejected}
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._tokens + (now - self._refilled_at) * self.rate_per_second, self.burst)
+        self._refilled_at = now
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures, failing every call fast for `reset_seconds`. Then lets a
+    single trial call through (half open), closing again if it succeeds and reopening if it doesn't.
+    """
+
+    def __init__(self, failure_threshold: int = COURT_TIMES_CIRCUIT_FAILURE_THRESHOLD,
+                 reset_seconds: float = COURT_TIMES_CIRCUIT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        """Raises CircuitOpenError if the call shouldn't go through."""
+        with self._lock:
+            if self.state == CIRCUIT_OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_CLOSED:
+                return
+            if self.state == CIRCUIT_HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            self.rejected += 1
+            retry_in = max(self.reset_seconds - (time.monotonic() - self._opened_at), 0)
+            raise CircuitOpenError(f"CourtReserve has failed {self.consecutive_failures} times in a row, retrying in {retry_in:.0f}s.")
+
+    def cancel_call(self):
+        """For a call let through that never reached upstream, e.g. because it was rate limited."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CIRCUIT_CLOSED:
+                logger.info("CourtReserve is back, closing the circuit.")
+            self.state = CIRCUIT_CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == CIRCUIT_HALF_OPEN or (self.state == CIRCUIT_CLOSED and self.consecutive_failures >= self.failure_threshold):
+                logger.warning(f"CourtReserve failed {self.consecutive_failures} times in a row, opening the circuit for {self.reset_seconds}s.")
+                self.state = CIRCUIT_OPEN
+                self._opened_at = time.monotonic()
+
+    def status(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "consecutive_failures": self.consecutive_failures, "rejected": self.rejected}
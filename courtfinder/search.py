@@ -0,0 +1,126 @@
+from datetime import date, datetime, time
+from typing import NamedTuple
+
+import numpy as np
+
+from courtfinder.constants import CLUB_OPENING_HOURS, RANK_BY_EARLIEST_START, RANK_BY_LEAST_FRAGMENTATION
+from courtfinder.timeutils import get_slot_index
+
+
+class SlotMatch(NamedTuple):
+    date: date
+    location: str
+    court: str
+    start: datetime
+    end: datetime
+    free_minutes: int  # Length of the whole free run the match sits in
+
+
+class SlotSearchIndex:
+    """
+    Index of the maximal runs of consecutive free slots of every court, across any number of days, for finding
+    courts that stay free for a whole duration.
+
+    Runs are kept sorted by length, so a query binary-searches to the runs that are long enough and only scans those,
+    instead of every slot of every court.
+    """
+
+    def __init__(self, occupancy_by_date: dict):
+        self.dates = sorted(occupancy_by_date)
+        self.slot_boundaries_by_date = [occupancy_by_date[court_date].slot_boundaries for court_date in self.dates]
+        first_slot_boundaries = self.slot_boundaries_by_date[0] if self.dates else []
+        self.slot_minutes = int((first_slot_boundaries[1] - first_slot_boundaries[0]).total_seconds()) // 60 if len(first_slot_boundaries) > 1 else 30
+        self.locations = sorted({location for occupancy in occupancy_by_date.values() for location in occupancy.courts_by_location})
+
+        # One row per (date, location, court)
+        self._row_courts = []
+        row_dates = []
+        row_locations = []
+        run_rows = []
+        run_starts = []
+        run_ends = []
+        for date_index, court_date in enumerate(self.dates):
+            occupancy = occupancy_by_date[court_date]
+            for location, courts in occupancy.courts_by_location.items():
+                free = occupancy.free_by_location[location]
+                first_row = len(self._row_courts)
+                self._row_courts.extend(courts)
+                row_dates.extend([date_index] * len(courts))
+                row_locations.extend([self.locations.index(location)] * len(courts))
+
+                # Pad with reserved slots on both sides so every free run has a rising and a falling edge
+                edges = np.diff(np.pad(free.astype(np.int8), ((0, 0), (1, 1))), axis=1)
+                start_rows, starts = np.nonzero(edges == 1)
+                _, ends = np.nonzero(edges == -1)
+                run_rows.append(start_rows + first_row)
+                run_starts.append(starts)
+                run_ends.append(ends)
+
+        self._row_dates = np.array(row_dates, dtype=np.intp)
+        self._row_locations = np.array(row_locations, dtype=np.intp)
+        run_rows = np.concatenate(run_rows) if run_rows else np.empty(0, dtype=np.intp)
+        run_starts = np.concatenate(run_starts) if run_starts else np.empty(0, dtype=np.intp)
+        run_ends = np.concatenate(run_ends) if run_ends else np.empty(0, dtype=np.intp)
+        order = np.argsort(run_ends - run_starts, kind='stable')
+        self._run_rows = run_rows[order]
+        self._run_starts = run_starts[order]
+        self._run_ends = run_ends[order]
+        self._run_lengths = self._run_ends - self._run_starts
+
+    def search(self, duration_minutes: int, start_time: time = None, end_time: time = None, dates: list = None,
+               locations: list = None, rank_by: str = RANK_BY_EARLIEST_START, limit: int = None) -> list:
+        """
+        Returns every (date, location, court, start) where the court is free for at least `duration_minutes` within
+        [start_time, end_time), optionally restricted to some dates and locations.
+
+        Matches are ranked by the earliest start, or by the least fragmentation, i.e. the ones that leave the least
+        free time around them in their run, then that don't split their run in two.
+        """
+        if duration_minutes <= 0:
+            raise ValueError(f"The duration has to be positive, got {duration_minutes} minutes.")
+        duration_slots = -(-duration_minutes // self.slot_minutes)
+        window_start = get_slot_index(start_time or time(CLUB_OPENING_HOURS[0]), self.slot_minutes, round_up=True)
+        window_end = get_slot_index(end_time or time(CLUB_OPENING_HOURS[1]), self.slot_minutes)
+
+        # Only runs at least as long as the duration can fit it
+        first_run = np.searchsorted(self._run_lengths, duration_slots, side='left')
+        rows = self._run_rows[first_run:]
+        starts = np.maximum(self._run_starts[first_run:], window_start)
+        ends = np.minimum(self._run_ends[first_run:], window_end)
+        candidates = ends - starts >= duration_slots
+        if dates is not None:
+            candidates &= np.isin(self._row_dates[rows], [self.dates.index(court_date) for court_date in dates if court_date in self.dates])
+        if locations is not None:
+            candidates &= np.isin(self._row_locations[rows], [self.locations.index(location) for location in locations if location in self.locations])
+        rows, starts, ends = rows[candidates], starts[candidates], ends[candidates]
+        run_starts = self._run_starts[first_run:][candidates]
+        run_ends = self._run_ends[first_run:][candidates]
+
+        # Every start within a run that still leaves room for the whole duration
+        start_counts = ends - starts - duration_slots + 1
+        offsets = np.arange(start_counts.sum()) - np.repeat(np.cumsum(start_counts) - start_counts, start_counts)
+        match_rows = np.repeat(rows, start_counts)
+        match_starts = np.repeat(starts, start_counts) + offsets
+        match_run_starts = np.repeat(run_starts, start_counts)
+        match_run_ends = np.repeat(run_ends, start_counts)
+        match_dates = self._row_dates[match_rows]
+
+        if rank_by == RANK_BY_EARLIEST_START:
+            order = np.lexsort((match_rows, match_starts, match_dates))
+        elif rank_by == RANK_BY_LEAST_FRAGMENTATION:
+            leftover_slots = match_run_ends - match_run_starts - duration_slots
+            split_runs = (match_starts > match_run_starts) & (match_starts + duration_slots < match_run_ends)
+            order = np.lexsort((match_rows, match_starts, match_dates, split_runs, leftover_slots))
+        else:
+            raise ValueError(f"Unknown ranking '{rank_by}', expected '{RANK_BY_EARLIEST_START}' or '{RANK_BY_LEAST_FRAGMENTATION}'.")
+        if limit is not None:
+            order = order[:limit]
+
+        matches = []
+        for match in order:
+            row = match_rows[match]
+            slot_boundaries = self.slot_boundaries_by_date[match_dates[match]]
+            matches.append(SlotMatch(self.dates[match_dates[match]], self.locations[self._row_locations[row]], self._row_courts[row],
+                                     slot_boundaries[match_starts[match]], slot_boundaries[match_starts[match] + duration_slots],
+                                     int(match_run_ends[match] - match_run_starts[match]) * self.slot_minutes))
+        return matches
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import queue
+import threading
+import traceback
+from collections import OrderedDict, defaultdict
+from datetime import date
+from typing import NamedTuple
+
+from courtfinder.availability import CourtAvailability, get_court_availability_for_date
+from courtfinder.constants import COURT_TIMES_CACHE_MAX_DATES, PST_TIME_ZONE
+from courtfinder.timeutils import get_datetime_by_hour
+
+logger = logging.getLogger(__name__)
+
+
+class AvailabilityDiff(NamedTuple):
+    """Slots that changed between two snapshots of the same date, as location -> court number -> [(start, end)]."""
+    date: date
+    opened: dict
+    closed: dict
+
+
+def diff_court_availability(previous: CourtAvailability, current: CourtAvailability, court_date: date) -> AvailabilityDiff:
+    opened = defaultdict(dict)
+    closed = defaultdict(dict)
+    for location in previous.courts_by_location.keys() | current.courts_by_location.keys():
+        previous_masks = dict(zip(previous.courts_by_location.get(location, ()), previous.masks_by_location.get(location, ())))
+        current_masks = dict(zip(current.courts_by_location.get(location, ()), current.masks_by_location.get(location, ())))
+        for court_number in previous_masks.keys() | current_masks.keys():
+            previous_mask = previous_masks.get(court_number, 0)
+            current_mask = current_masks.get(court_number, 0)
+            # Only the changed slots get materialized as datetimes
+            if current_mask & ~previous_mask:
+                opened[location][court_number] = current.get_slot_times(current_mask & ~previous_mask)
+            if previous_mask & ~current_mask:
+                closed[location][court_number] = previous.get_slot_times(previous_mask & ~current_mask)
+    return AvailabilityDiff(court_date, dict(opened), dict(closed))
+
+
+class AvailabilitySnapshotStore:
+    """
+    Keeps the last computed available court times for each date and publishes what changed every time a date is
+    recomputed, so that consumers can react to small deltas instead of re-scanning whole days.
+
+    Snapshots remember the scheduler payload they were computed from, so that sessions, the waitlist watcher and
+    the API all share the one computed for the payload the cache hands out rather than each computing their own.
+    """
+
+    def __init__(self, max_dates: int = COURT_TIMES_CACHE_MAX_DATES):
+        self.max_dates = max_dates
+        self._snapshots = OrderedDict()  # date -> (scheduler payload, CourtAvailability), least recently updated first
+        self._subscribers = []  # Callables receiving every non-empty AvailabilityDiff
+        self._lock = threading.Lock()
+
+    def get(self, court_date: date) -> CourtAvailability:
+        with self._lock:
+            snapshot = self._snapshots.get(court_date)
+            return snapshot[1] if snapshot is not None else None
+
+    def get_for_court_times(self, court_date: date, court_times: list) -> CourtAvailability:
+        """Returns the availability of the `court_times` payload, only computing it if it isn't the stored one."""
+        with self._lock:
+            snapshot = self._snapshots.get(court_date)
+        if snapshot is not None and snapshot[0] is court_times:
+            return snapshot[1]
+        availability = get_court_availability_for_date(get_datetime_by_hour(court_date, 0, PST_TIME_ZONE), court_times)
+        self.update(court_date, availability, court_times)
+        return availability
+
+    def update(self, court_date: date, availability: CourtAvailability, court_times: list = None):
+        with self._lock:
+            previous = self._snapshots.get(court_date)
+            self._snapshots[court_date] = (court_times, availability)
+            self._snapshots.move_to_end(court_date)
+            while len(self._snapshots) > self.max_dates:
+                self._snapshots.popitem(last=False)
+            subscribers = list(self._subscribers)
+
+        # The first snapshot of a date is the baseline, there's nothing to diff it against
+        if previous is None:
+            return None
+        previous = previous[1]
+        diff = diff_court_availability(previous, availability, court_date)
+        if diff.opened or diff.closed:
+            logger.info(f"Availability changed on {court_date}: {sum(map(len, diff.opened.values()))} court(s) with opened "
+                        f"slots, {sum(map(len, diff.closed.values()))} court(s) with closed slots.")
+            for subscriber in subscribers:
+                try:
+                    subscriber(diff)
+                except Exception as e:
+                    logger.error(f"Availability subscriber failed for {court_date} - {type(e).__name__}: {str(e)}")
+                    logger.error(traceback.format_exc())
+        return diff
+
+    def on_court_times_loaded(self, cache_key, court_times: list):
+        self.get_for_court_times(cache_key[1], court_times)
+
+    def subscribe(self):
+        """
+        Returns a generator blocking on and yielding every AvailabilityDiff published from its first iteration on.
+        Nothing is registered until then, so a generator that is never iterated doesn't leave a queue behind.
+        """
+        def iterate_diffs():
+            diffs = queue.Queue()
+            self._add_subscriber(diffs.put)
+            try:
+                while True:
+                    yield diffs.get()
+            finally:
+                self._remove_subscriber(diffs.put)
+
+        return iterate_diffs()
+
+    def subscribe_async(self):
+        """Same as subscribe(), as an async iterator bound to the event loop iterating it."""
+        async def iterate_diffs():
+            loop = asyncio.get_running_loop()
+            diffs = asyncio.Queue()
+
+            def deliver(diff):
+                loop.call_soon_threadsafe(diffs.put_nowait, diff)
+
+            self._add_subscriber(deliver)
+            try:
+                while True:
+                    yield await diffs.get()
+            finally:
+                self._remove_subscriber(deliver)
+
+        return iterate_diffs()
+
+    def _add_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers.append(subscriber)
+
+    def _remove_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers.remove(subscriber)
@@ -0,0 +1,74 @@
+import re
+from datetime import datetime, timedelta, time
+from zoneinfo import ZoneInfo
+
+from courtfinder.constants import CLUB_OPENING_HOURS, PST_TIME_ZONE
+
+
+def get_datetime_by_hour(date: datetime, hour: int, timezone: str):
+    return datetime.combine(date, time(hour=hour), tzinfo=ZoneInfo(timezone))
+
+
+def get_last_court_start_time(end_time: datetime):
+    return end_time - timedelta(minutes=30)
+
+
+def get_slot_index(slot_start: datetime, slot_minutes: int = 30, round_up: bool = False):
+    # Rounding up gives the first slot starting at or after the time, instead of the slot containing it
+    minutes = slot_start.hour * 60 + slot_start.minute - CLUB_OPENING_HOURS[0] * 60
+    return -(-minutes // slot_minutes) if round_up else minutes // slot_minutes
+
+
+def validate_time_range(start_time: time, end_time: time):
+    if not time(CLUB_OPENING_HOURS[0]) <= start_time < end_time <= time(CLUB_OPENING_HOURS[1]):
+        raise ValueError(f"The time range has to be between opening ({CLUB_OPENING_HOURS[0]}:00) and closing ({CLUB_OPENING_HOURS[1]}:00).")
+
+
+def generate_intervals_end_time_inclusive(start_time: datetime, end_time: datetime, interval_minutes: int = 30):
+    intervals = []
+    current_time = start_time
+    while current_time <= end_time:
+        intervals.append(current_time)
+        current_time += timedelta(minutes=interval_minutes)
+    return intervals
+
+
+def get_epoch_minutes(dt: datetime) -> int:
+    return int(dt.timestamp()) // 60
+
+
+def get_default_datetime():
+    current_datetime = datetime.now(ZoneInfo(PST_TIME_ZONE))
+    if current_datetime.time() > time(21, 30):  # Latest court time is 9:30 PM
+        return current_datetime + timedelta(days=1)
+    return current_datetime
+
+
+def get_formatted_time(time_to_format):
+    return time_to_format.strftime('%I:%M %p')
+
+
+def get_formatted_time_by_hour(hour: int):
+    return get_formatted_time(get_time_by_hour(hour))
+
+
+def get_time_by_hour(hour: int):
+    return time(hour, 0)
+
+
+def parse_time(value: str) -> time:
+    normalized_value = value.replace(' ', '').upper()
+    for time_format in ('%H:%M', '%I%p', '%I:%M%p'):
+        try:
+            return datetime.strptime(normalized_value, time_format).time()
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid time '{value}', expected e.g. 19:00, 7PM or 7:30PM.")
+
+
+def get_court_number(court_name: str):
+    match = re.search(r'\d+', court_name)
+    if match:
+        return int(match.group())
+    else:
+        return float('inf')
@@ -0,0 +1,312 @@
+"""
+Waitlist watches: users register the (date, locations, time window, duration) they want, and one shared poller tells
+them through a notifier as soon as a court is free for it, instead of them refreshing the app over and over.
+"""
+import json
+import logging
+import threading
+import uuid
+from datetime import date, datetime, time, timedelta
+from typing import NamedTuple
+
+import numpy as np
+import requests
+
+from courtfinder.availability import CourtAvailability, iterate_set_bit_runs
+from courtfinder.cache import CourtTimesCache
+from courtfinder.constants import (BBCLocation, COURT_TIMES_REQUEST_TIMEOUT_SECONDS, PST_TIME_ZONE,
+                                   WATCH_NOTIFY_FILE, WATCH_NOTIFY_WEBHOOK_URL, WATCH_POLL_MAX_INTERVAL_SECONDS,
+                                   WATCH_POLL_MIN_INTERVAL_SECONDS)
+from courtfinder.fetch import fetch_court_times_data, get_court_times_cache_key
+from courtfinder.search import SlotMatch
+from courtfinder.snapshots import AvailabilitySnapshotStore
+from courtfinder.timeutils import get_datetime_by_hour, get_default_datetime, get_slot_index, validate_time_range
+
+logger = logging.getLogger(__name__)
+
+LOCATIONS = BBCLocation.get_all_locations()
+
+
+class Watch(NamedTuple):
+    watch_id: str
+    date: date
+    locations: tuple
+    start_time: time
+    end_time: time
+    duration_minutes: int
+    contact: str = None  # Passed through to the notifier, e.g. who to tell
+
+
+class WatchIndex:
+    """
+    Interval index over the time windows of every watch on one date.
+
+    Windows are sorted by their first slot, so each free run of each court only scans the watches starting before the
+    run ends, checking all of them at once. Matching thousands of watches costs about as much as matching one.
+    """
+
+    def __init__(self, watches: list, slot_minutes: int = 30):
+        self.slot_minutes = slot_minutes
+        window_starts = np.array([get_slot_index(watch.start_time, slot_minutes, round_up=True) for watch in watches], dtype=np.int64)
+        order = np.argsort(window_starts, kind='stable')
+        self.watches = [watches[watch] for watch in order]
+        self.window_starts = window_starts[order]
+        self.window_ends = np.array([get_slot_index(watch.end_time, slot_minutes) for watch in self.watches], dtype=np.int64)
+        self.duration_slots = np.array([-(-watch.duration_minutes // slot_minutes) for watch in self.watches], dtype=np.int64)
+        self.location_bits = np.array([sum(1 << LOCATIONS.index(location) for location in watch.locations) for watch in self.watches],
+                                      dtype=np.int64)
+
+    def match(self, court_date: date, availability: CourtAvailability) -> dict:
+        """Returns watch id -> [SlotMatch] with the earliest fitting start on every court free for the watch."""
+        matches_by_watch_id = {}
+        slot_boundaries = [availability.get_slot_start(slot) for slot in range(availability.slot_count + 1)]
+        for location, courts in availability.courts_by_location.items():
+            if location not in LOCATIONS:
+                continue
+            watches_at_location = (self.location_bits & (1 << LOCATIONS.index(location))) != 0
+            for court, mask in zip(courts, availability.masks_by_location[location]):
+                # Runs come earliest first, a court only matches a watch on the first one that fits
+                unmatched = watches_at_location.copy()
+                for run_start, run_end in iterate_set_bit_runs(mask):
+                    # Only windows starting before the run ends can overlap it
+                    candidate_count = np.searchsorted(self.window_starts, run_end, side='left')
+                    match_starts = np.maximum(self.window_starts[:candidate_count], run_start)
+                    fits = np.minimum(self.window_ends[:candidate_count], run_end) - match_starts >= self.duration_slots[:candidate_count]
+                    fits &= unmatched[:candidate_count]
+                    unmatched[:candidate_count] &= ~fits
+                    free_minutes = (run_end - run_start) * self.slot_minutes
+                    for watch, match_start, duration_slots in zip(np.flatnonzero(fits).tolist(), match_starts[fits].tolist(),
+                                                                  self.duration_slots[:candidate_count][fits].tolist()):
+                        matches_by_watch_id.setdefault(self.watches[watch].watch_id, []).append(SlotMatch(
+                            court_date, location, court, slot_boundaries[match_start], slot_boundaries[match_start + duration_slots],
+                            free_minutes))
+        return matches_by_watch_id
+
+
+class WaitlistWatcher:
+    """
+    Single background poller serving every registered watch.
+
+    Watches are grouped by date, so a date is fetched once per poll however many watches it has, through the shared
+    cache so that polls also coalesce with the UI and the prefetch. Dates further out are polled less often. A watch
+    is notified once, the first time a court is free for it, and then dropped. If notifying it fails, it is kept and
+    matched again on the next poll.
+    """
+
+    def __init__(self, cache: CourtTimesCache, session: requests.Session, notifier, snapshot_store: AvailabilitySnapshotStore = None,
+                 min_interval_seconds: float = WATCH_POLL_MIN_INTERVAL_SECONDS,
+                 max_interval_seconds: float = WATCH_POLL_MAX_INTERVAL_SECONDS):
+        self.cache = cache
+        self.session = session
+        self.notifier = notifier
+        self.snapshot_store = snapshot_store or AvailabilitySnapshotStore()  # Where availability is computed once per payload
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self._watches_by_date = {}  # date -> {watch_id: Watch}
+        self._index_by_date = {}  # date -> WatchIndex, dropped whenever the date's watches change
+        self._next_poll_by_date = {}  # date -> datetime
+        self._last_matched_by_date = {}  # date -> scheduler payload last matched, to skip matching it twice
+        self._lock = threading.Lock()
+        self._wake_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="waitlist-watcher", daemon=True)
+
+    def start(self):
+        logger.info("Starting the waitlist watcher.")
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        self._stop_event.set()
+        self._wake_event.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def register(self, court_date: date, locations: list, start_time: time, end_time: time, duration_minutes: int,
+                 contact: str = None) -> Watch:
+        unknown_locations = [location for location in locations if location not in LOCATIONS]
+        if unknown_locations:
+            raise ValueError(f"Unknown locations {unknown_locations}, expected any of {LOCATIONS}.")
+        validate_time_range(start_time, end_time)
+        if not 0 < duration_minutes <= (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute):
+            raise ValueError(f"A duration of {duration_minutes} minutes doesn't fit between {start_time} and {end_time}.")
+
+        locations = tuple(sorted(set(locations), key=LOCATIONS.index))
+        with self._lock:
+            watches = self._watches_by_date.setdefault(court_date, {})
+            # The same request twice is the same watch
+            for watch in watches.values():
+                if watch[1:] == (court_date, locations, start_time, end_time, duration_minutes, contact):
+                    return watch
+            watch = Watch(uuid.uuid4().hex, court_date, locations, start_time, end_time, duration_minutes, contact)
+            watches[watch.watch_id] = watch
+            self._index_by_date.pop(court_date, None)
+            self._last_matched_by_date.pop(court_date, None)
+            self._next_poll_by_date[court_date] = datetime.now()
+        logger.info(f"Watching {locations} on {court_date} from {start_time} to {end_time} for {duration_minutes} minutes.")
+        self._wake_event.set()
+        return watch
+
+    def unregister(self, watch_id: str) -> bool:
+        with self._lock:
+            for court_date, watches in self._watches_by_date.items():
+                if watches.pop(watch_id, None) is not None:
+                    self._forget_date_if_empty(court_date)
+                    self._index_by_date.pop(court_date, None)
+                    return True
+        return False
+
+    def watches(self) -> list:
+        with self._lock:
+            return [watch for watches in self._watches_by_date.values() for watch in watches.values()]
+
+    def get_poll_interval(self, court_date: date, today: date = None) -> float:
+        """Doubles from the minimum interval for today's watches with every day further out, up to the maximum."""
+        days_ahead = max((court_date - (today or get_default_datetime().date())).days, 0)
+        return min(self.min_interval_seconds * 2 ** min(days_ahead, 32), self.max_interval_seconds)
+
+    def poll(self):
+        """Checks every date that is due, returning when the next one will be."""
+        now = datetime.now()
+        today = get_default_datetime().date()
+        with self._lock:
+            for past_date in [court_date for court_date in self._watches_by_date if court_date < today]:
+                logger.info(f"Dropping {len(self._watches_by_date[past_date])} expired watch(es) on {past_date}.")
+                self._watches_by_date[past_date].clear()
+                self._forget_date_if_empty(past_date)
+            due_dates = [court_date for court_date, next_poll in self._next_poll_by_date.items() if next_poll <= now]
+            for court_date in due_dates:
+                self._next_poll_by_date[court_date] = now + timedelta(seconds=self.get_poll_interval(court_date, today))
+
+        for court_date in due_dates:
+            court_datetime = get_datetime_by_hour(court_date, 0, PST_TIME_ZONE)
+            try:
+                court_times = self.cache.get(get_court_times_cache_key(court_datetime),
+                                             lambda: fetch_court_times_data(court_datetime, self.session))
+            except Exception as e:
+                logger.warning(f"Unable to poll court times on {court_date} - {type(e).__name__}: {e}")
+                continue
+            self.match(court_date, court_times)
+
+        with self._lock:
+            return min(self._next_poll_by_date.values(), default=None)
+
+    def on_court_times_loaded(self, cache_key, court_times: list):
+        # Any fetch of a watched date, e.g. from the UI or the prefetch, is a free poll
+        self.match(cache_key[1], court_times)
+
+    def match(self, court_date: date, court_times: list):
+        with self._lock:
+            watches = self._watches_by_date.get(court_date)
+            if not watches or self._last_matched_by_date.get(court_date) is court_times:
+                return
+            self._last_matched_by_date[court_date] = court_times
+            index = self._index_by_date.get(court_date)
+            if index is None:
+                index = self._index_by_date[court_date] = WatchIndex(list(watches.values()))
+
+        matches_by_watch_id = index.match(court_date, self.snapshot_store.get_for_court_times(court_date, court_times))
+        if not matches_by_watch_id:
+            return
+
+        with self._lock:
+            watches = self._watches_by_date.get(court_date, {})
+            matched_watches = [watches.pop(watch_id) for watch_id in matches_by_watch_id if watch_id in watches]
+            self._index_by_date.pop(court_date, None)
+            self._forget_date_if_empty(court_date)
+        failed_watches = []
+        for watch in matched_watches:
+            try:
+                self.notifier.notify(watch, matches_by_watch_id[watch.watch_id])
+            except Exception as e:
+                logger.error(f"Unable to notify watch {watch.watch_id}, retrying on the next poll - {type(e).__name__}: {e}")
+                failed_watches.append(watch)
+        if failed_watches:
+            self._restore(court_date, failed_watches)
+
+    def _restore(self, court_date: date, watches: list):
+        # Puts back watches that matched but couldn't be told, so the next poll matches them again
+        with self._lock:
+            watches_on_date = self._watches_by_date.setdefault(court_date, {})
+            for watch in watches:
+                watches_on_date.setdefault(watch.watch_id, watch)
+            self._index_by_date.pop(court_date, None)
+            self._last_matched_by_date.pop(court_date, None)
+            self._next_poll_by_date.setdefault(court_date, datetime.now() + timedelta(seconds=self.get_poll_interval(court_date)))
+
+    def _forget_date_if_empty(self, court_date: date):
+        if not self._watches_by_date.get(court_date):
+            self._watches_by_date.pop(court_date, None)
+            self._index_by_date.pop(court_date, None)
+            self._next_poll_by_date.pop(court_date, None)
+            self._last_matched_by_date.pop(court_date, None)
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                next_poll = self.poll()
+            except Exception as e:
+                logger.error(f"Waitlist poll failed - {type(e).__name__}: {e}")
+                next_poll = None
+            wait_seconds = self.max_interval_seconds if next_poll is None else max((next_poll - datetime.now()).total_seconds(), 0)
+            self._wake_event.wait(wait_seconds)
+            self._wake_event.clear()
+
+
+############################################################################################
+# Notifiers, anything with a notify(watch, matches) method
+############################################################################################
+def get_notification(watch: Watch, matches: list) -> dict:
+    return {
+        "watch": {
+            "id": watch.watch_id,
+            "date": str(watch.date),
+            "locations": list(watch.locations),
+            "start": watch.start_time.strftime('%H:%M'),
+            "end": watch.end_time.strftime('%H:%M'),
+            "duration_minutes": watch.duration_minutes,
+            "contact": watch.contact,
+        },
+        "matches": [{"location": match.location, "court": match.court, "start": match.start.isoformat(),
+                     "end": match.end.isoformat()} for match in matches],
+    }
+
+
+class LogNotifier:
+    def notify(self, watch: Watch, matches: list):
+        logger.info(f"Watch {watch.watch_id} matched {len(matches)} court(s) on {watch.date}: "
+                    f"{', '.join(f'{match.location} {match.court} at {match.start:%H:%M}' for match in matches)}.")
+
+
+class FileNotifier:
+    """Appends every notification as a line of JSON, e.g. for trying watches out locally."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def notify(self, watch: Watch, matches: list):
+        line = json.dumps(get_notification(watch, matches), separators=(',', ':'))
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class WebhookNotifier:
+    """POSTs every notification as JSON to a webhook, e.g. a Slack bot."""
+
+    def __init__(self, url: str, session: requests.Session = None, timeout_seconds: float = COURT_TIMES_REQUEST_TIMEOUT_SECONDS):
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout_seconds = timeout_seconds
+
+    def notify(self, watch: Watch, matches: list):
+        response = self.session.post(self.url, json=get_notification(watch, matches), timeout=self.timeout_seconds)
+        response.raise_for_status()
+
+
+def create_notifier():
+    """Returns the notifier configured through the environment, or None when watches aren't set up."""
+    if WATCH_NOTIFY_WEBHOOK_URL:
+        return WebhookNotifier(WATCH_NOTIFY_WEBHOOK_URL)
+    if WATCH_NOTIFY_FILE:
+        return FileNotifier(WATCH_NOTIFY_FILE)
+    return None
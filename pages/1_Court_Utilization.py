@@ -0,0 +1,157 @@
+import os
+import traceback
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import altair as alt
+import pandas as pd
+import streamlit as st
+from streamlit.logger import get_logger
+
+from courtfinder.analytics import WEEKDAYS, UtilizationAggregates
+from courtfinder.constants import (BBCLocation, COURT_TIMES_HISTORY_DIR, PST_TIME_ZONE, UTILIZATION_AGGREGATES_FILE,
+                                   UTILIZATION_BACKFILL_MAX_WEEKS)
+from courtfinder.fetch import fetch_court_times_for_dates
+from courtfinder.history import CourtTimesHistory
+from courtfinder.metrics import span
+
+logger = get_logger(__name__)
+
+
+############################################################################################
+# Shared resources
+############################################################################################
+@st.cache_resource
+def get_history_reader():
+    # Only reads what the app appends to the history directory
+    return CourtTimesHistory(COURT_TIMES_HISTORY_DIR) if COURT_TIMES_HISTORY_DIR else None
+
+
+@st.cache_resource
+def get_utilization_aggregates() -> UtilizationAggregates:
+    aggregates_path = get_aggregates_path()
+    if aggregates_path and os.path.exists(aggregates_path):
+        return UtilizationAggregates.load(aggregates_path)
+    return UtilizationAggregates()
+
+
+def get_aggregates_path():
+    return os.path.join(COURT_TIMES_HISTORY_DIR, UTILIZATION_AGGREGATES_FILE) if COURT_TIMES_HISTORY_DIR else None
+
+
+############################################################################################
+# Data Refreshes
+############################################################################################
+def update_aggregates(aggregates: UtilizationAggregates, history: CourtTimesHistory):
+    # Only reads the history appended since the last update, so this is cheap on every rerun
+    if aggregates.update_from_history(history, get_today()):
+        aggregates.save(get_aggregates_path())
+
+
+def backfill_aggregates(aggregates: UtilizationAggregates, weeks: int) -> tuple:
+    """Returns the number of days fetched and of the ones that couldn't be, which are fetched again on the next backfill."""
+    today = get_today()
+    court_dates = [today - timedelta(days=day) for day in range(1, weeks * 7 + 1)]
+    court_dates = [court_date for court_date in court_dates if not aggregates.has_date(court_date)]
+    fetched_at = datetime.now(timezone.utc)
+    court_times_by_date, errors_by_date = fetch_court_times_for_dates(court_dates)
+    for court_date, court_times in court_times_by_date.items():
+        aggregates.add_court_times(court_date, court_times, fetched_at, today)
+    if get_aggregates_path():
+        aggregates.save(get_aggregates_path())
+    return len(court_times_by_date), len(errors_by_date)
+
+
+def get_today():
+    return datetime.now(ZoneInfo(PST_TIME_ZONE)).date()
+
+
+############################################################################################
+# UI Utils
+############################################################################################
+def get_heatmap_chart(utilization, rows: list, row_title: str, slot_labels: list) -> alt.Chart:
+    df = pd.DataFrame(utilization, index=rows, columns=slot_labels).rename_axis(index=row_title, columns='Start time')
+    df = df.stack(future_stack=True).rename('Reserved').reset_index()
+    return alt.Chart(df).mark_rect().encode(
+        x=alt.X('Start time:O', sort=slot_labels),
+        y=alt.Y(f'{row_title}:O', sort=rows),
+        color=alt.Color('Reserved:Q', scale=alt.Scale(scheme='redyellowgreen', reverse=True, domain=[0, 1]),
+                        legend=alt.Legend(format='%')),
+        tooltip=[row_title, 'Start time', alt.Tooltip('Reserved:Q', format='.0%')],
+    )
+
+
+def get_most_free_slots_df(aggregates: UtilizationAggregates, locations: list, limit: int = 15) -> pd.DataFrame:
+    slot_labels = aggregates.get_slot_labels()
+    rows = []
+    for location in locations:
+        courts, utilization = aggregates.get_court_utilization(location)
+        if not courts:
+            continue
+        free_courts = (1 - utilization).sum(axis=1)  # Expected free courts per weekday and slot, NaN on weekdays never observed
+        for weekday, slot in zip(*(free_courts > 0).nonzero()):
+            rows.append({"Location": location, "Weekday": WEEKDAYS[weekday], "Start time": slot_labels[slot],
+                         "Expected free courts": round(float(free_courts[weekday, slot]), 1),
+                         "Reserved": round(float(utilization[weekday, :, slot].mean()) * 100)})
+    df = pd.DataFrame(rows, columns=["Location", "Weekday", "Start time", "Expected free courts", "Reserved"])
+    return df.sort_values("Expected free courts", ascending=False).head(limit).reset_index(drop=True)
+
+
+def main():
+    try:
+        st.set_page_config(page_title="BBC Court Utilization", page_icon=":badminton_racquet_and_shuttlecock:", layout='wide')
+        st.title("Court Utilization @ BBC")
+        st.write("How often every court has been reserved on past days, to find the location, court and time combinations that are reliably free.")
+
+        aggregates = get_utilization_aggregates()
+        history = get_history_reader()
+        if history:
+            update_aggregates(aggregates, history)
+
+        with st.expander("Fetch past days from CourtReserve"):
+            with st.form("backfill_form"):
+                weeks = st.slider("Weeks", min_value=1, max_value=UTILIZATION_BACKFILL_MAX_WEEKS, value=4)
+                if st.form_submit_button("Fetch"):
+                    with st.spinner("Fetching past days..."):
+                        fetched_days, failed_days = backfill_aggregates(aggregates, weeks)
+                    st.success(f"Fetched {fetched_days} days.")
+                    if failed_days:
+                        st.warning(f"Couldn't fetch {failed_days} days from CourtReserve, fetch again in a bit for the rest.")
+
+        locations = [location for location in BBCLocation.get_all_locations() if location in aggregates.locations]
+        if not locations:
+            st.info("There's no history yet. Fetch past days above"
+                    + ("." if history else ", or set COURT_TIMES_HISTORY_DIR for the app to record every day it fetches."))
+            return
+
+        location = st.selectbox("Location", locations)
+        observed_days = aggregates.get_observed_days(location)
+        st.caption(f"Based on {observed_days.sum()} past days, "
+                   + ", ".join(f"{days} {weekday}s" for weekday, days in zip(WEEKDAYS, observed_days.tolist())) + ".")
+        slot_labels = aggregates.get_slot_labels()
+
+        st.write(f"### :green[{location}] by weekday")
+        st.write("Share of the courts reserved at every start time.")
+        with span('render_utilization_heatmap'):
+            st.altair_chart(get_heatmap_chart(aggregates.get_location_utilization(location), list(WEEKDAYS), 'Weekday', slot_labels),
+                            use_container_width=True)
+
+        weekday = st.radio("Weekday", WEEKDAYS, horizontal=True)
+        courts, utilization = aggregates.get_court_utilization(location)
+        st.write(f"### :green[{location}] courts on {weekday}s")
+        st.write("Share of the days each court was reserved at every start time.")
+        with span('render_utilization_heatmap'):
+            st.altair_chart(get_heatmap_chart(utilization[WEEKDAYS.index(weekday)], list(courts), 'Court', slot_labels),
+                            use_container_width=True)
+
+        st.write("### Most reliably free")
+        st.dataframe(get_most_free_slots_df(aggregates, locations), hide_index=True,
+                     column_config={"Reserved": st.column_config.ProgressColumn("Reserved", format="%d%%", min_value=0, max_value=100)})
+    except Exception as e:
+        logger.error(f"{type(e).__name__}: {str(e)}")
+        logger.error(traceback.format_exc())
+        st.error("Oops, something went wrong.")
+
+
+if __name__ == "__main__":
+    main()
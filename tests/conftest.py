@@ -0,0 +1,17 @@
+import pytest
+
+import courtfinder.fetch
+from benchmarks.fixture_server import FixtureServer
+from courtfinder.cache import CourtTimesCache
+from courtfinder.resilience import CircuitBreaker, TokenBucket
+
+
+@pytest.fixture
+def fixture_server(monkeypatch):
+    """Fixture server the fetches go to, with their own cache, rate limiter and circuit breaker."""
+    with FixtureServer() as server:
+        monkeypatch.setattr(courtfinder.fetch, 'COURT_BOOKINGS_API_URL', server.url)
+        monkeypatch.setattr(courtfinder.fetch, '_court_times_cache', CourtTimesCache())
+        monkeypatch.setattr(courtfinder.fetch, '_rate_limiter', TokenBucket(rate_per_second=8, burst=4))
+        monkeypatch.setattr(courtfinder.fetch, '_circuit_breaker', CircuitBreaker(failure_threshold=2))
+        yield server
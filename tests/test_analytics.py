@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta, timezone
+
+from courtfinder.analytics import UtilizationAggregates
+from courtfinder.history import CourtTimesHistory
+from tests.test_availability import reservation
+
+COURT_DATE = date(2024, 5, 1)
+FETCHED_AT = datetime(2024, 4, 30, 12, tzinfo=timezone.utc)
+TODAY = date(2024, 5, 2)
+
+
+def test_utilization_is_replaced_by_an_empty_payload(tmp_path):
+    history = CourtTimesHistory(str(tmp_path))
+    history.append(COURT_DATE, [reservation("Bellevue 1", COURT_DATE, (6, 0), (22, 0))], FETCHED_AT)
+    aggregates = UtilizationAggregates()
+    assert aggregates.update_from_history(history, TODAY) == 1
+    assert aggregates.get_observed_days("Bellevue").sum() == 1
+
+    history.append(COURT_DATE, [], FETCHED_AT + timedelta(minutes=1))
+    assert aggregates.update_from_history(history, TODAY) == 1
+    assert aggregates.get_observed_days("Bellevue").sum() == 0
+    assert aggregates.update_from_history(history, TODAY) == 0
+
+
+def test_utilization_from_history_matches_fetched_payloads(tmp_path):
+    history = CourtTimesHistory(str(tmp_path))
+    fetched_aggregates = UtilizationAggregates()
+    for day in range(14):
+        court_date = COURT_DATE + timedelta(days=day)
+        for fetch, court_times in enumerate([[reservation("Bellevue 1", court_date, (6, 0), (8, 0))],
+                                             [reservation("Bellevue 2", court_date, (7, 0), (9, 30)),
+                                              reservation("Renton 1", court_date, (20, 0), (22, 0))]]):
+            fetched_at = FETCHED_AT + timedelta(days=day, minutes=fetch)
+            history.append(court_date, court_times, fetched_at)
+            fetched_aggregates.add_court_times(court_date, court_times, fetched_at, COURT_DATE + timedelta(days=14))
+
+    history_aggregates = UtilizationAggregates()
+    history_aggregates.update_from_history(history, COURT_DATE + timedelta(days=14))
+    for location in ("Bellevue", "Renton"):
+        assert history_aggregates.get_observed_days(location).tolist() == fetched_aggregates.get_observed_days(location).tolist()
+        history_courts, history_utilization = history_aggregates.get_court_utilization(location)
+        fetched_courts, fetched_utilization = fetched_aggregates.get_court_utilization(location)
+        assert history_courts == fetched_courts
+        assert (history_utilization == fetched_utilization).all()
+
+
+def test_hidden_entries_are_not_counted(tmp_path):
+    history = CourtTimesHistory(str(tmp_path))
+    history.append(COURT_DATE, [reservation("Bellevue 10", COURT_DATE, (8, 0), (18, 0), hidden=True),
+                                reservation("Bellevue 11", COURT_DATE, (19, 0), (20, 0))], FETCHED_AT)
+    aggregates = UtilizationAggregates()
+    aggregates.update_from_history(history, TODAY)
+    courts, utilization = aggregates.get_court_utilization("Bellevue")
+    assert courts == ("Court 11",)
+    weekday = COURT_DATE.weekday()
+    assert utilization[weekday, 0].tolist() == [0.0] * 26 + [1.0] * 2 + [0.0] * 4
@@ -0,0 +1,124 @@
+import asyncio
+import gzip
+import json
+from datetime import date
+
+import pytest
+
+import courtfinder.fetch
+from courtfinder.api import AvailabilityApi
+
+COURT_DATE = date(2024, 5, 1)
+
+
+def request(app: AvailabilityApi, query: str, headers: dict = None, method: str = 'GET', path: str = '/availability') -> tuple:
+    """Calls the ASGI app directly, returning (status, headers, body)."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+             'headers': [(name.encode(), value.encode()) for name, value in (headers or {}).items()]}
+    asyncio.run(app(scope, receive, send))
+    start, body = messages
+    return start['status'], dict(start['headers']), body['body']
+
+
+def test_availability(fixture_server):
+    app = AvailabilityApi()
+    status, headers, body = request(app, f'date={COURT_DATE}&locations=Bellevue,Renton&start=7PM&end=9PM')
+    assert status == 200
+    assert headers[b'content-type'] == b'application/json'
+    assert int(headers[b'content-length']) == len(body)
+    availability = json.loads(body)
+    assert (availability["date"], availability["start"], availability["end"]) == (str(COURT_DATE), "19:00", "21:00")
+    assert set(availability["free_courts"]) == set(availability["free_slots"]) == {"Bellevue", "Renton"}
+    for location, court_slots in availability["free_slots"].items():
+        for court in availability["free_courts"][location]:
+            assert court_slots[court] == ["19:00", "19:30", "20:00", "20:30"]
+
+    # The ETag only depends on the content, also once the response is rendered again
+    assert request(AvailabilityApi(), f'date={COURT_DATE}&locations=Bellevue,Renton&start=7PM&end=9PM')[1][b'etag'] == headers[b'etag']
+    assert request(app, f'date={COURT_DATE}&locations=Bellevue&start=7PM&end=9PM')[1][b'etag'] != headers[b'etag']
+
+
+@pytest.mark.parametrize("if_none_match, status", [('{etag}', 304), ('W/{etag}', 304), ('"other", {etag}', 304), ('*', 304),
+                                                    ('"other"', 200)])
+def test_if_none_match(fixture_server, if_none_match, status):
+    app = AvailabilityApi()
+    etag = request(app, f'date={COURT_DATE}')[1][b'etag'].decode()
+    response_status, headers, body = request(app, f'date={COURT_DATE}', {'if-none-match': if_none_match.format(etag=etag)})
+    assert response_status == status
+    assert headers[b'etag'].decode() == etag
+    if status == 304:
+        assert body == b''
+        assert b'content-length' not in headers
+
+
+def test_gzip(fixture_server):
+    app = AvailabilityApi()
+    _, headers, body = request(app, f'date={COURT_DATE}')
+    status, gzip_headers, gzip_body = request(app, f'date={COURT_DATE}', {'accept-encoding': 'gzip, deflate'})
+    assert status == 200
+    assert gzip_headers[b'content-encoding'] == b'gzip'
+    assert gzip.decompress(gzip_body) == body
+    assert gzip_headers[b'etag'] != headers[b'etag']
+    assert request(app, f'date={COURT_DATE}', {'accept-encoding': 'gzip', 'if-none-match': gzip_headers[b'etag'].decode()})[0] == 304
+    # The identity representation doesn't match the compressed one's ETag
+    assert request(app, f'date={COURT_DATE}', {'if-none-match': gzip_headers[b'etag'].decode()})[0] == 200
+
+    # Small responses aren't compressed
+    _, headers, _ = request(app, f'date={COURT_DATE}&locations=Renton&start=7PM&end=8PM', {'accept-encoding': 'gzip'})
+    assert b'content-encoding' not in headers
+
+
+def test_head(fixture_server):
+    app = AvailabilityApi()
+    _, get_headers, get_body = request(app, f'date={COURT_DATE}')
+    status, headers, body = request(app, f'date={COURT_DATE}', method='HEAD')
+    assert status == 200
+    assert body == b''
+    assert headers == get_headers
+    assert int(headers[b'content-length']) == len(get_body)
+
+
+@pytest.mark.parametrize("query", ['date=2024-13-01', 'date=tomorrow', 'start=9PM&end=7PM', 'start=5AM', 'end=11PM',
+                                   'start=noon', 'locations=Bellevue,Seattle'])
+def test_bad_request(fixture_server, query):
+    status, headers, body = request(AvailabilityApi(), query)
+    assert status == 400
+    assert headers[b'content-type'] == b'application/json'
+    assert json.loads(body)["error"]
+    assert fixture_server.stats()["requests"] == 0
+
+
+def test_upstream_failure(fixture_server):
+    fixture_server.error_rate = 1
+    status, _, body = request(AvailabilityApi(), f'date={COURT_DATE}')
+    assert status == 502
+    assert json.loads(body) == {"error": "Unable to get court times from CourtReserve."}
+
+
+def test_unknown_path_and_method(fixture_server):
+    assert request(AvailabilityApi(), '', path='/courts')[0] == 404
+    status, headers, _ = request(AvailabilityApi(), f'date={COURT_DATE}', method='POST')
+    assert status == 405
+    assert headers[b'allow'] == b'GET, HEAD'
+
+
+def test_stale_court_times_are_marked(fixture_server):
+    app = AvailabilityApi()
+    status, headers, _ = request(app, f'date={COURT_DATE}')
+    assert status == 200
+    assert b'age' not in headers and b'warning' not in headers
+
+    courtfinder.fetch.get_court_times_cache().ttl_seconds = 0
+    fixture_server.error_rate = 1
+    status, headers, _ = request(app, f'date={COURT_DATE}')
+    assert status == 200
+    assert int(headers[b'age']) >= 0
+    assert headers[b'warning'] == b'110 - "Response is Stale"'
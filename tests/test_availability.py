@@ -0,0 +1,169 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from benchmarks.synthetic import generate_court_times_data
+from courtfinder.availability import (CourtAvailability, compute_available_court_times_by_location, get_court_occupancy,
+                                      get_available_court_times_from_occupancy, parse_court_label, parse_reservations)
+from courtfinder.constants import CLUB_OPENING_HOURS, PST_TIME_ZONE
+from courtfinder.timeutils import get_datetime_by_hour
+
+COURT_DATE = date(2024, 5, 1)
+DST_DATES = [date(2024, 3, 10), date(2024, 11, 3)]
+
+
+def get_available_court_times_by_location_reference(court_date: datetime, court_times: list) -> dict:
+    """The original nested loop checking every 30 minute slot of every court against each of its reservations."""
+    reserved_court_times_by_location = defaultdict(lambda: defaultdict(list))
+    available_court_times_by_location = defaultdict(lambda: defaultdict(list))
+
+    for item in court_times:
+        if not item["EventOnlineSignUpOff"] and not item["CanSignUpToEvent"] and not item["RegistrationOpen"]:
+            continue
+
+        court_location, court_number = parse_court_label(item["CourtLabel"])
+        reserved_court_times_by_location[court_location][court_number].append(
+            (to_pst_datetime(item["Start"]), to_pst_datetime(item["End"])))
+        available_court_times_by_location[court_location][court_number] = []
+
+    available_30min_intervals = []
+    current_time = get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[0], PST_TIME_ZONE)
+    while current_time <= get_datetime_by_hour(court_date, CLUB_OPENING_HOURS[1], PST_TIME_ZONE):
+        available_30min_intervals.append(current_time)
+        current_time += timedelta(minutes=30)
+
+    for location, court_times_by_court_number in reserved_court_times_by_location.items():
+        for court_number, reserved_court_times in court_times_by_court_number.items():
+            available_court_times = []
+            for i in range(len(available_30min_intervals) - 1):
+                interval_start = available_30min_intervals[i]
+                interval_end = available_30min_intervals[i + 1]
+                is_available = True
+                for reserved_start, reserved_end in reserved_court_times:
+                    if interval_end <= reserved_start or interval_start >= reserved_end:
+                        continue
+                    else:
+                        is_available = False
+                        break
+                if is_available:
+                    available_court_times.append((interval_start, interval_end))
+            available_court_times_by_location[location][court_number] = available_court_times
+    return available_court_times_by_location
+
+
+def to_pst_datetime(utc_timestamp: str) -> datetime:
+    return datetime.fromisoformat(utc_timestamp[:-1]).replace(tzinfo=timezone.utc).astimezone(ZoneInfo(PST_TIME_ZONE))
+
+
+def to_utc_timestamp(court_date: date, hour: int, minute: int = 0) -> str:
+    local_datetime = datetime.combine(court_date, datetime.min.time(), tzinfo=ZoneInfo(PST_TIME_ZONE)) + timedelta(hours=hour, minutes=minute)
+    return local_datetime.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def reservation(court_label: str, court_date: date, start: tuple, end: tuple, hidden: bool = False) -> dict:
+    return {
+        "CourtLabel": court_label,
+        "Start": to_utc_timestamp(court_date, *start),
+        "End": to_utc_timestamp(court_date, *end),
+        "EventOnlineSignUpOff": not hidden,
+        "CanSignUpToEvent": False,
+        "RegistrationOpen": False,
+    }
+
+
+def to_dict(available_court_times_by_location: dict) -> dict:
+    return {location: dict(court_times_by_court) for location, court_times_by_court in available_court_times_by_location.items()}
+
+
+def assert_matches_reference(court_date: date, court_times: list):
+    court_datetime = get_datetime_by_hour(court_date, 0, PST_TIME_ZONE)
+    expected = to_dict(get_available_court_times_by_location_reference(court_datetime, court_times))
+    assert to_dict(compute_available_court_times_by_location(court_datetime, court_times)) == expected
+    occupancy = get_court_occupancy(court_datetime, parse_reservations(court_times))
+    assert to_dict(get_available_court_times_from_occupancy(occupancy)) == expected
+
+
+@pytest.mark.parametrize("start, end", [
+    ((6, 0), (7, 0)),  # Aligned on slots
+    ((6, 15), (7, 0)),  # Starts in the middle of a slot
+    ((6, 0), (6, 45)),  # Ends in the middle of a slot
+    ((9, 10), (9, 20)),  # Within a single slot
+    ((21, 59), (22, 0)),  # Last minute of the day
+    ((12, 0), (12, 0)),  # Empty
+])
+def test_unaligned_reservations(start, end):
+    assert_matches_reference(COURT_DATE, [reservation("Bellevue 1", COURT_DATE, start, end),
+                                          reservation("Bellevue 2", COURT_DATE, (10, 0), (11, 0))])
+
+
+@pytest.mark.parametrize("start, end", [
+    ((3, 0), (5, 0)),  # Entirely before opening
+    ((5, 0), (6, 30)),  # Overlapping opening
+    ((22, 0), (23, 0)),  # Entirely after closing
+    ((21, 30), (23, 30)),  # Overlapping closing
+    ((0, 0), (24, 0)),  # The whole day and more
+])
+def test_reservations_outside_opening_hours(start, end):
+    assert_matches_reference(COURT_DATE, [reservation("Renton 3", COURT_DATE, start, end)])
+
+
+def test_hidden_entries_are_ignored():
+    court_times = [
+        reservation("Bellevue 10", COURT_DATE, (8, 0), (18, 0), hidden=True),
+        reservation("Bellevue 11", COURT_DATE, (8, 0), (18, 0), hidden=True),
+        reservation("Bellevue 11", COURT_DATE, (19, 0), (20, 0)),
+    ]
+    assert_matches_reference(COURT_DATE, court_times)
+    available_court_times_by_location = compute_available_court_times_by_location(get_datetime_by_hour(COURT_DATE, 0, PST_TIME_ZONE), court_times)
+    # A court with only hidden entries isn't listed at all, like with the original loop
+    assert list(available_court_times_by_location["Bellevue"]) == ["Court 11"]
+
+
+def test_coaching_and_multi_word_labels():
+    court_times = [
+        reservation("Mukilteo Pickleball 12", COURT_DATE, (7, 0), (8, 0)),
+        reservation("Bellevue COACHING 3", COURT_DATE, (7, 30), (9, 0)),
+        reservation("Bellevue 3", COURT_DATE, (8, 0), (8, 30)),
+    ]
+    assert_matches_reference(COURT_DATE, court_times)
+    available_court_times_by_location = compute_available_court_times_by_location(get_datetime_by_hour(COURT_DATE, 0, PST_TIME_ZONE), court_times)
+    assert set(available_court_times_by_location) == {"Mukilteo Pickleball", "Bellevue"}
+    # Coaching labels keep the second word as the court name, like the original loop did
+    assert list(available_court_times_by_location["Bellevue"]) == ["Court 3", "Court COACHING"]
+
+
+@pytest.mark.parametrize("court_date", DST_DATES)
+def test_dst_dates(court_date):
+    court_times = [
+        reservation("Bellevue 1", court_date, (6, 0), (8, 0)),
+        reservation("Bellevue 2", court_date, (1, 30), (6, 30)),  # Overlapping the DST change
+        reservation("Renton 1", court_date, (20, 15), (22, 0)),
+    ]
+    assert_matches_reference(court_date, court_times)
+    slots = compute_available_court_times_by_location(get_datetime_by_hour(court_date, 0, PST_TIME_ZONE), court_times)["Renton"]["Court 1"]
+    assert (slots[0][0].hour, slots[-1][1].hour) == (6, 20)
+
+
+@pytest.mark.parametrize("court_date", [COURT_DATE + timedelta(days=day) for day in range(0, 28, 3)] + DST_DATES)
+@pytest.mark.parametrize("occupancy_rate", [0.1, 0.4, 0.9])
+def test_synthetic_days(court_date, occupancy_rate):
+    assert_matches_reference(court_date, generate_court_times_data(court_date, occupancy_rate))
+
+
+@pytest.mark.parametrize("start_time, end_time", [(time(6), time(22)), (time(19), time(21)), (time(19, 15), time(20, 45)),
+                                                  (time(5), time(7)), (time(21, 30), time(23))])
+def test_courts_free_between(start_time, end_time):
+    court_datetime = get_datetime_by_hour(COURT_DATE, 0, PST_TIME_ZONE)
+    court_times = generate_court_times_data(COURT_DATE, occupancy_rate=0.2)
+    expected = {}
+    for location, court_times_by_court in compute_available_court_times_by_location(court_datetime, court_times).items():
+        # Free when every slot overlapping the range is among the free ones
+        slot_starts = [court_datetime + timedelta(hours=CLUB_OPENING_HOURS[0], minutes=30 * slot) for slot in range(32)]
+        overlapping = [slot_start for slot_start in slot_starts
+                       if slot_start.time() < end_time and (slot_start + timedelta(minutes=30)).time() > start_time]
+        expected[location] = [court for court, slots in court_times_by_court.items()
+                              if set(overlapping) <= {slot_start for slot_start, _ in slots}]
+    availability = CourtAvailability.from_occupancy(get_court_occupancy(court_datetime, parse_reservations(court_times)))
+    assert availability.get_courts_free_between(start_time, end_time) == expected
@@ -0,0 +1,65 @@
+import threading
+import time
+
+import pytest
+
+from courtfinder.cache import CourtTimesCache
+
+
+def get_concurrently(cache: CourtTimesCache, key, loader, callers: int) -> list:
+    outcomes = []
+
+    def get():
+        try:
+            outcomes.append(cache.get(key, loader))
+        except Exception as e:
+            outcomes.append(e)
+
+    threads = [threading.Thread(target=get) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+
+def slow_loader(calls: list, result=None, error: Exception = None):
+    def load():
+        calls.append(1)
+        time.sleep(0.1)  # Long enough for every caller to be waiting on the first one
+        if error:
+            raise error
+        return result
+    return load
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = CourtTimesCache()
+    calls = []
+    assert get_concurrently(cache, 'key', slow_loader(calls, result='value'), callers=8) == ['value'] * 8
+    assert len(calls) == 1
+
+
+def test_failed_load_is_raised_to_every_waiter():
+    cache = CourtTimesCache()
+    calls = []
+    error = ConnectionError("upstream is down")
+    assert get_concurrently(cache, 'key', slow_loader(calls, error=error), callers=8) == [error] * 8
+    assert len(calls) == 1
+
+
+def test_failed_reload_serves_the_stale_value():
+    cache = CourtTimesCache(ttl_seconds=0)
+    cache.put('key', 'stale value')
+    calls = []
+    assert get_concurrently(cache, 'key', slow_loader(calls, error=ConnectionError()), callers=8) == ['stale value'] * 8
+    assert len(calls) == 1
+    assert cache.stats()["stale_served"] == 8
+
+
+def test_failed_refresh_is_raised():
+    cache = CourtTimesCache()
+    cache.put('key', 'value')
+    with pytest.raises(ConnectionError):
+        cache.refresh('key', slow_loader([], error=ConnectionError()))
+    assert cache.get('key', slow_loader([], result='new value')) == 'value'
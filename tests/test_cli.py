@@ -0,0 +1,17 @@
+import subprocess
+import sys
+
+# Only imported once the CLI has work to do, so that e.g. --help starts quickly
+HEAVY_MODULES = ('numpy', 'pandas', 'requests', 'streamlit')
+
+
+def test_importing_the_cli_stays_light():
+    code = f"import sys, courtfinder.cli; print(*[module for module in {HEAVY_MODULES!r} if module in sys.modules])"
+    loaded = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout.split()
+    assert loaded == []
+
+
+def test_help():
+    result = subprocess.run([sys.executable, '-m', 'courtfinder', '--help'], capture_output=True, text=True)
+    assert result.returncode == 0
+    assert '--search HOURS' in result.stdout
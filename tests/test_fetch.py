@@ -0,0 +1,102 @@
+import time
+from datetime import date, timedelta
+
+import pytest
+import requests
+
+import courtfinder.fetch
+from courtfinder.constants import PST_TIME_ZONE
+from courtfinder.fetch import (create_court_times_session, fetch_court_times_data, fetch_court_times_for_dates,
+                               get_court_occupancy_for_range, is_upstream_failure)
+from courtfinder.resilience import CIRCUIT_CLOSED, CIRCUIT_OPEN, CircuitBreaker, CircuitOpenError, RateLimitedError, TokenBucket
+from courtfinder.timeutils import get_datetime_by_hour
+
+COURT_DATETIME = get_datetime_by_hour(date(2024, 5, 1), 0, PST_TIME_ZONE)
+
+
+def test_fetch(fixture_server):
+    court_times = fetch_court_times_data(COURT_DATETIME, create_court_times_session())
+    assert court_times and all(item["CourtLabel"] for item in court_times)
+    assert fixture_server.stats()["requests"] == 1
+
+
+def test_throttled_fetch_is_not_retried(fixture_server):
+    fixture_server.throttle_rate = 1  # Every response is a 429 with Retry-After: 1
+    session = create_court_times_session()
+    start = time.perf_counter()
+    with pytest.raises(requests.exceptions.HTTPError):
+        fetch_court_times_data(COURT_DATETIME, session)
+    assert time.perf_counter() - start < 1
+    assert fixture_server.stats()["requests"] == 1
+    # Throttling slows down the rate limiter rather than counting as upstream failing
+    assert courtfinder.fetch.get_rate_limiter().rate_per_second == 4
+    assert courtfinder.fetch.get_circuit_breaker().state == CIRCUIT_CLOSED
+
+
+def test_failures_open_the_circuit(fixture_server):
+    fixture_server.error_rate = 1
+    session = create_court_times_session()
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            fetch_court_times_data(COURT_DATETIME, session)
+    assert courtfinder.fetch.get_circuit_breaker().state == CIRCUIT_OPEN
+
+    requests_before = fixture_server.stats()["requests"]
+    with pytest.raises(CircuitOpenError):
+        fetch_court_times_data(COURT_DATETIME, session)
+    assert fixture_server.stats()["requests"] == requests_before
+
+
+def test_rate_limited_trial_is_cancelled(fixture_server, monkeypatch):
+    circuit_breaker = courtfinder.fetch.get_circuit_breaker()
+    for _ in range(2):
+        circuit_breaker.record_failure()
+    circuit_breaker.reset_seconds = 0  # Half open on the next call
+    monkeypatch.setattr(courtfinder.fetch, '_rate_limiter', TokenBucket(rate_per_second=1, burst=1, max_wait_seconds=0))
+    session = create_court_times_session()
+    fetch_court_times_data(COURT_DATETIME, session)  # Uses up the only token, closing the circuit
+
+    for _ in range(2):
+        circuit_breaker.record_failure()
+    with pytest.raises(RateLimitedError):
+        fetch_court_times_data(COURT_DATETIME, session)
+    # The trial never reached upstream, so the next call is still let through as one
+    courtfinder.fetch.get_rate_limiter().max_wait_seconds = 2
+    fetch_court_times_data(COURT_DATETIME, session)
+    assert circuit_breaker.state == CIRCUIT_CLOSED
+    assert fixture_server.stats()["requests"] == 2
+
+
+@pytest.mark.parametrize("fetch_range", [
+    lambda days: fetch_court_times_for_dates([COURT_DATETIME + timedelta(days=day) for day in range(days)]),
+    lambda days: get_court_occupancy_for_range(COURT_DATETIME, days),
+])
+def test_failed_days_dont_fail_the_range(fixture_server, monkeypatch, fetch_range):
+    fixture_server.error_rate = 0.5
+    # Neither throttle nor fail fast, so that every date gets its own chance
+    monkeypatch.setattr(courtfinder.fetch, '_rate_limiter', TokenBucket(rate_per_second=1000, burst=1000))
+    monkeypatch.setattr(courtfinder.fetch, '_circuit_breaker', CircuitBreaker(failure_threshold=1000))
+    by_date, errors_by_date = fetch_range(14)
+
+    assert by_date.keys() | errors_by_date.keys() == {COURT_DATETIME.date() + timedelta(days=day) for day in range(14)}
+    assert not by_date.keys() & errors_by_date.keys()
+    assert all(isinstance(error, requests.exceptions.HTTPError) for error in errors_by_date.values())
+    stats = fixture_server.stats()
+    assert (len(by_date), len(errors_by_date)) == (stats["requests"] - stats["errors"], stats["errors"])
+
+
+def test_range_with_upstream_down(fixture_server):
+    fixture_server.error_rate = 1
+    occupancy_by_date, errors_by_date = get_court_occupancy_for_range(COURT_DATETIME, 7)
+    assert occupancy_by_date == {}
+    assert len(errors_by_date) == 7
+
+
+@pytest.mark.parametrize("status_code, is_failure", [(None, True), (400, False), (404, False), (429, False),
+                                                     (500, True), (503, True)])
+def test_is_upstream_failure(status_code, is_failure):
+    response = None
+    if status_code is not None:
+        response = requests.Response()
+        response.status_code = status_code
+    assert is_upstream_failure(requests.exceptions.RequestException(response=response)) == is_failure
@@ -0,0 +1,43 @@
+import os
+from datetime import date, datetime, timedelta, timezone
+
+from courtfinder.history import CourtTimesHistory
+from tests.test_availability import reservation
+
+COURT_DATE = date(2024, 5, 1)
+FETCHED_AT = datetime(2024, 4, 30, 12, tzinfo=timezone.utc)
+
+
+def get_reserved_courts(history: CourtTimesHistory, as_of: datetime = None) -> list:
+    reservations = history.get_reservations(COURT_DATE, as_of)
+    return [reservations.courts[court_id] for court_id in reservations.court_ids.tolist()]
+
+
+def test_latest_payload_can_be_empty(tmp_path):
+    history = CourtTimesHistory(str(tmp_path))
+    history.append(COURT_DATE, [reservation("Bellevue 1", COURT_DATE, (18, 0), (19, 0))], FETCHED_AT)
+    history.append(COURT_DATE, [], FETCHED_AT + timedelta(minutes=1))
+
+    assert get_reserved_courts(history) == []
+    assert get_reserved_courts(history, as_of=FETCHED_AT) == [("Bellevue", "Court 1")]
+    assert get_reserved_courts(history, as_of=FETCHED_AT - timedelta(minutes=1)) == []
+
+
+def test_payload_index_is_rebuilt_for_older_directories(tmp_path):
+    history = CourtTimesHistory(str(tmp_path))
+    history.append(COURT_DATE, [reservation("Bellevue 1", COURT_DATE, (18, 0), (19, 0))], FETCHED_AT)
+    history.append(COURT_DATE, [reservation("Renton 2", COURT_DATE, (18, 0), (19, 0)),
+                                reservation("Renton 3", COURT_DATE, (18, 0), (19, 0))], FETCHED_AT + timedelta(minutes=1))
+    payloads = history.read_payloads().copy()
+    os.remove(history.payloads_path)
+
+    history = CourtTimesHistory(str(tmp_path))
+    assert history.read_payloads().tolist() == payloads.tolist()
+    assert get_reserved_courts(history) == [("Renton", "Court 2"), ("Renton", "Court 3")]
+
+
+def test_reader_sees_labels_appended_by_another_instance(tmp_path):
+    reader = CourtTimesHistory(str(tmp_path))
+    writer = CourtTimesHistory(str(tmp_path))
+    writer.append(COURT_DATE, [reservation("Kirkland 4", COURT_DATE, (18, 0), (19, 0))], FETCHED_AT)
+    assert get_reserved_courts(reader) == [("Kirkland", "Court 4")]
@@ -0,0 +1,97 @@
+import pytest
+
+from courtfinder.resilience import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN, CircuitBreaker, CircuitOpenError,
+                                    RateLimitedError, TokenBucket)
+
+
+def test_token_bucket_rejects_past_the_burst():
+    bucket = TokenBucket(rate_per_second=1, burst=2, max_wait_seconds=0)
+    bucket.acquire()
+    bucket.acquire()
+    with pytest.raises(RateLimitedError):
+        bucket.acquire()
+    assert bucket.status()["rejected"] == 1
+
+
+def test_token_bucket_waits_for_a_token_within_max_wait():
+    bucket = TokenBucket(rate_per_second=100, burst=1, max_wait_seconds=1)
+    bucket.acquire()
+    bucket.acquire()  # Waits about 10ms for the next token
+    assert bucket.status()["rejected"] == 0
+
+
+def test_token_bucket_halves_when_throttled_and_recovers():
+    bucket = TokenBucket(rate_per_second=8, burst=1, min_rate_per_second=1)
+    bucket.on_throttled()
+    assert bucket.rate_per_second == 4
+    for _ in range(3):
+        bucket.on_throttled()
+    assert bucket.rate_per_second == 1  # Not below the minimum
+
+    bucket.on_success()
+    assert bucket.rate_per_second == pytest.approx(1.8)
+    for _ in range(20):
+        bucket.on_success()
+    assert bucket.rate_per_second == 8  # Not above the configured rate
+
+
+def open_circuit_breaker(failure_threshold: int = 2) -> CircuitBreaker:
+    circuit_breaker = CircuitBreaker(failure_threshold=failure_threshold, reset_seconds=30)
+    for _ in range(failure_threshold):
+        circuit_breaker.before_call()
+        circuit_breaker.record_failure()
+    return circuit_breaker
+
+
+def test_circuit_opens_after_consecutive_failures():
+    circuit_breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        circuit_breaker.before_call()
+        circuit_breaker.record_failure()
+    circuit_breaker.before_call()
+    circuit_breaker.record_success()  # Resets the count
+    for _ in range(2):
+        circuit_breaker.before_call()
+        circuit_breaker.record_failure()
+    assert circuit_breaker.state == CIRCUIT_CLOSED
+
+    circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == CIRCUIT_OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.before_call()
+    assert circuit_breaker.status()["rejected"] == 1
+
+
+def test_half_open_circuit_lets_a_single_trial_through():
+    circuit_breaker = open_circuit_breaker()
+    circuit_breaker.reset_seconds = 0
+    circuit_breaker.before_call()
+    assert circuit_breaker.state == CIRCUIT_HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.before_call()
+
+    circuit_breaker.record_success()
+    assert circuit_breaker.state == CIRCUIT_CLOSED
+    circuit_breaker.before_call()
+
+
+def test_failed_trial_reopens_the_circuit():
+    circuit_breaker = open_circuit_breaker()
+    circuit_breaker.reset_seconds = 0
+    circuit_breaker.before_call()
+    circuit_breaker.record_failure()
+    assert circuit_breaker.state == CIRCUIT_OPEN
+
+    circuit_breaker.reset_seconds = 30
+    with pytest.raises(CircuitOpenError):
+        circuit_breaker.before_call()
+
+
+def test_cancelled_trial_lets_the_next_call_through():
+    circuit_breaker = open_circuit_breaker()
+    circuit_breaker.reset_seconds = 0
+    circuit_breaker.before_call()
+    circuit_breaker.cancel_call()
+    circuit_breaker.before_call()
+    assert circuit_breaker.state == CIRCUIT_HALF_OPEN
@@ -0,0 +1,78 @@
+from datetime import date, time, timedelta
+
+import pytest
+
+from benchmarks.synthetic import generate_court_times_data
+from courtfinder.availability import get_court_occupancy_for_date
+from courtfinder.constants import PST_TIME_ZONE, RANK_BY_EARLIEST_START, RANK_BY_LEAST_FRAGMENTATION
+from courtfinder.search import SlotSearchIndex
+from courtfinder.timeutils import get_datetime_by_hour, get_slot_index
+
+COURT_DATES = [date(2024, 5, 1) + timedelta(days=day) for day in range(5)] + [date(2024, 11, 3)]
+
+
+@pytest.fixture(scope='module')
+def occupancy_by_date():
+    return {court_date: get_court_occupancy_for_date(get_datetime_by_hour(court_date, 0, PST_TIME_ZONE), generate_court_times_data(court_date))
+            for court_date in COURT_DATES}
+
+
+def search_brute_force(occupancy_by_date: dict, duration_minutes: int, start_time: time, end_time: time,
+                       dates: list = None, locations: list = None) -> set:
+    """Every (date, location, court, start, end, free minutes) found by checking every start slot of every court."""
+    matches = set()
+    for court_date, occupancy in occupancy_by_date.items():
+        if dates is not None and court_date not in dates:
+            continue
+        slot_boundaries = occupancy.slot_boundaries
+        duration_slots = -(-duration_minutes // 30)
+        window_start = get_slot_index(start_time, round_up=True)
+        window_end = get_slot_index(end_time)
+        for location, courts in occupancy.courts_by_location.items():
+            if locations is not None and location not in locations:
+                continue
+            for court, free in zip(courts, occupancy.free_by_location[location].tolist()):
+                for start in range(window_start, window_end - duration_slots + 1):
+                    if all(free[start:start + duration_slots]):
+                        run_start = start
+                        while run_start > 0 and free[run_start - 1]:
+                            run_start -= 1
+                        run_end = start + duration_slots
+                        while run_end < len(free) and free[run_end]:
+                            run_end += 1
+                        matches.add((court_date, location, court, slot_boundaries[start], slot_boundaries[start + duration_slots],
+                                     (run_end - run_start) * 30))
+    return matches
+
+
+@pytest.mark.parametrize("duration_minutes", [30, 45, 60, 120, 240])
+@pytest.mark.parametrize("start_time, end_time", [(time(6), time(22)), (time(17), time(22)), (time(9, 15), time(12, 45))])
+@pytest.mark.parametrize("dates, locations", [(None, None), (COURT_DATES[1:3], ["Bellevue", "Renton"])])
+def test_matches_brute_force(occupancy_by_date, duration_minutes, start_time, end_time, dates, locations):
+    index = SlotSearchIndex(occupancy_by_date)
+    expected = search_brute_force(occupancy_by_date, duration_minutes, start_time, end_time, dates, locations)
+    for rank_by in (RANK_BY_EARLIEST_START, RANK_BY_LEAST_FRAGMENTATION):
+        matches = index.search(duration_minutes, start_time, end_time, dates, locations, rank_by=rank_by)
+        assert len(matches) == len(expected)
+        assert set(tuple(match) for match in matches) == expected
+
+    earliest_matches = index.search(duration_minutes, start_time, end_time, dates, locations, rank_by=RANK_BY_EARLIEST_START)
+    assert [(match.date, match.start) for match in earliest_matches] == sorted((match.date, match.start) for match in earliest_matches)
+    fragmentation_matches = index.search(duration_minutes, start_time, end_time, dates, locations, rank_by=RANK_BY_LEAST_FRAGMENTATION)
+    leftover_minutes = [match.free_minutes - (match.end - match.start).total_seconds() // 60 for match in fragmentation_matches]
+    assert leftover_minutes == sorted(leftover_minutes)
+
+
+def test_limit(occupancy_by_date):
+    index = SlotSearchIndex(occupancy_by_date)
+    assert index.search(60, limit=5) == index.search(60)[:5]
+
+
+@pytest.mark.parametrize("duration_minutes", [0, -30])
+def test_duration_has_to_be_positive(occupancy_by_date, duration_minutes):
+    with pytest.raises(ValueError):
+        SlotSearchIndex(occupancy_by_date).search(duration_minutes)
+
+
+def test_empty_index():
+    assert SlotSearchIndex({}).search(60) == []
@@ -0,0 +1,103 @@
+import asyncio
+import gc
+import threading
+from datetime import date
+
+import pytest
+
+from courtfinder.snapshots import AvailabilitySnapshotStore
+from tests.test_availability import reservation
+
+COURT_DATE = date(2024, 5, 1)
+EVENING = [reservation("Bellevue 1", COURT_DATE, (18, 0), (19, 0))]
+EARLY_EVENING = [reservation("Bellevue 1", COURT_DATE, (18, 0), (18, 30))]
+
+
+def test_availability_is_computed_once_per_payload():
+    store = AvailabilitySnapshotStore()
+    court_times = list(EVENING)
+    availability = store.get_for_court_times(COURT_DATE, court_times)
+    assert store.get_for_court_times(COURT_DATE, court_times) is availability
+    assert store.get(COURT_DATE) is availability
+    # An equal but refetched payload is another snapshot
+    assert store.get_for_court_times(COURT_DATE, list(court_times)) is not availability
+
+
+def next_diff(store: AvailabilitySnapshotStore, diffs) -> list:
+    """Publishes new payloads until the subscriber running in another thread receives one of their diffs."""
+    received = []
+    thread = threading.Thread(target=lambda: received.append(next(diffs)))
+    thread.start()
+    payloads = [EARLY_EVENING, EVENING]
+    while thread.is_alive():
+        store.get_for_court_times(COURT_DATE, list(payloads[0]))
+        payloads.reverse()
+        thread.join(0.01)
+    return received
+
+
+def test_subscribe():
+    store = AvailabilitySnapshotStore()
+    store.get_for_court_times(COURT_DATE, EVENING)
+    diffs = store.subscribe()
+    [diff] = next_diff(store, diffs)
+    assert diff.date == COURT_DATE
+    assert diff.opened or diff.closed
+
+    diffs.close()
+    assert store._subscribers == []
+
+
+def test_unstarted_subscription_is_not_registered():
+    store = AvailabilitySnapshotStore()
+    diffs = store.subscribe()
+    assert store._subscribers == []
+    diffs.close()
+    store.subscribe_async()
+    assert store._subscribers == []
+
+
+def test_subscribe_async_publishes_what_changed():
+    store = AvailabilitySnapshotStore()
+
+    async def receive_diff():
+        diffs = store.subscribe_async()
+        next_diff = asyncio.ensure_future(anext(diffs))
+        await asyncio.sleep(0)  # Lets the subscription register
+        store.get_for_court_times(COURT_DATE, EVENING)
+        store.on_court_times_loaded((7031, COURT_DATE), EARLY_EVENING)
+        diff = await next_diff
+        await diffs.aclose()
+        return diff
+
+    diff = asyncio.run(receive_diff())
+    assert [(start.hour, start.minute) for start, _ in diff.opened["Bellevue"]["Court 1"]] == [(18, 30)]
+    assert diff.closed == {}
+    assert store._subscribers == []
+
+
+def subscribe_from_closed_event_loop(store: AvailabilitySnapshotStore):
+    """Leaves an async subscriber behind whose event loop has closed."""
+    async def subscribe_async():
+        diffs = store.subscribe_async()
+        asyncio.ensure_future(anext(diffs))
+        await asyncio.sleep(0)
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(subscribe_async())
+    loop.close()
+
+
+# The abandoned subscription's pending get() complains about its closed loop when collected along with the store
+@pytest.mark.filterwarnings('ignore::pytest.PytestUnraisableExceptionWarning')
+def test_failing_subscriber_does_not_stop_the_others():
+    store = AvailabilitySnapshotStore()
+    store.get_for_court_times(COURT_DATE, EVENING)
+    subscribe_from_closed_event_loop(store)
+
+    diffs = store.subscribe()
+    [diff] = next_diff(store, diffs)
+    assert diff.date == COURT_DATE
+    diffs.close()
+    del store
+    gc.collect()
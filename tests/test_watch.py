@@ -0,0 +1,37 @@
+from datetime import date, time
+
+from courtfinder.cache import CourtTimesCache
+from courtfinder.watch import WaitlistWatcher
+from tests.test_availability import reservation
+
+COURT_DATE = date(2024, 5, 1)
+
+
+class FlakyNotifier:
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.notified = []
+
+    def notify(self, watch, matches):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("webhook is down")
+        self.notified.append((watch, matches))
+
+
+def test_watch_is_kept_until_it_is_notified():
+    notifier = FlakyNotifier(failures=1)
+    watcher = WaitlistWatcher(CourtTimesCache(), session=None, notifier=notifier)
+    watch = watcher.register(COURT_DATE, ["Bellevue"], time(18), time(20), 60)
+    court_times = [reservation("Bellevue 1", COURT_DATE, (6, 0), (19, 0))]
+
+    watcher.match(COURT_DATE, court_times)
+    assert watcher.watches() == [watch]
+    assert not notifier.notified
+
+    # Matched again even though the court times are the same
+    watcher.match(COURT_DATE, court_times)
+    assert watcher.watches() == []
+    [(notified_watch, matches)] = notifier.notified
+    assert notified_watch == watch
+    assert [(match.court, match.start.time(), match.end.time()) for match in matches] == [("Court 1", time(19), time(20))]